@@ -0,0 +1,98 @@
+import collections
+import threading
+import time
+from pyo import NewTable
+
+# Background allocator for track tables
+# Long loops need tables of millions of samples. Whenever the config changes, a worker
+# thread builds and zeroes the tables the next tracks will need and parks them in a deque;
+# Track.prepare() takes one from there instead of allocating on the caller's thread.
+# Only the tables still wanted are built: every take() counts against the request, so a
+# table the caller had to allocate itself is not built a second time, and nothing is left
+# parked once the slots have taken theirs. take() never waits for the worker.
+class TableAllocator:
+    def __init__(self, channels=2, feedback=0.5):
+        self.channels = channels
+        self.feedback = feedback
+        self.ready = collections.deque()  # (length, table) ready to be handed out
+        self.condition = threading.Condition()
+        self.length = None  # Table length (seconds) for the current config
+        self.wanted = 0  # Tables of that length not taken yet
+
+        # Statistics
+        self.allocations = 0
+        self.alloc_time = 0.0
+        self.max_alloc_time = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    # Ask for `count` tables of `length` seconds; tables built for an older request are dropped
+    def request(self, length, count):
+        with self.condition:
+            if length != self.length:
+                self.ready.clear()
+            self.length = length
+            self.wanted = count
+            while len(self.ready) > count:
+                self.ready.pop()
+            self.condition.notify_all()
+
+    # A table the worker has already built, or None
+    def take_ready(self, length):
+        with self.condition:
+            if length == self.length and self.ready:
+                self.wanted -= 1
+                self.hits += 1
+                return self.ready.popleft()[1]
+        return None
+
+    def take(self, length):
+        table = self.take_ready(length)
+        if table is not None:
+            return table
+        with self.condition:
+            if length == self.length and self.wanted > 0:
+                self.wanted -= 1  # The worker builds one fewer
+        # Nothing ready, allocate on the caller's thread
+        self.misses += 1
+        return self.allocate(length)
+
+    def allocate(self, length):
+        start = time.perf_counter()
+        table = NewTable(length=length, chnls=self.channels, feedback=self.feedback)
+        table.reset()  # Touch every sample now rather than on the first record pass
+        elapsed = time.perf_counter() - start
+        self.allocations += 1
+        self.alloc_time += elapsed
+        self.max_alloc_time = max(self.max_alloc_time, elapsed)
+        return table
+
+    # Bytes held by the tables parked in the deque
+    def nbytes(self):
+        return sum(table.getSize() * len(table) * 4 for _, table in list(self.ready))
+
+    def metrics(self):
+        return {
+            "allocations": self.allocations,
+            "avg_alloc_ms": self.alloc_time / self.allocations * 1000 if self.allocations else 0.0,
+            "max_alloc_ms": self.max_alloc_time * 1000,
+            "hits": self.hits,
+            "misses": self.misses,
+            "ready": len(self.ready),
+        }
+
+    def run(self):
+        while True:
+            with self.condition:
+                while len(self.ready) >= self.wanted:
+                    self.condition.wait()
+                length = self.length
+            table = self.allocate(length)
+            with self.condition:
+                # Dropped if the config changed or enough tables were taken while allocating
+                if length == self.length and len(self.ready) < self.wanted:
+                    self.ready.append((length, table))
+                self.condition.notify_all()
@@ -0,0 +1,184 @@
+import argparse
+import glob
+import json
+import mmap
+import os
+import struct
+import time
+from PIL import Image
+from layout import render_text
+from render_cache import load_font
+
+# Packed asset bundle
+# Opening and converting every PNG in screens/ and rendering the menu text costs a noticeable
+# part of a Pi's cold start. The bundle holds all of them already as 1-bit framebuffers
+# (PIL '1' rows, packed 8 pixels to a byte) in one file: a small JSON index up front, the
+# bitmaps after it. At startup the file is only memory-mapped and the index read; each
+# asset is decoded into an image the first time it is asked for and kept.
+#
+# The bundle sits next to this file and is rebuilt on startup whenever a screen or font
+# it was built from has changed, or by hand:
+#   python assets.py
+
+MAGIC = b'LPAS'
+VERSION = 1
+HEADER = struct.Struct('<4sII')  # Magic, version, index length
+BUNDLE_FILE = 'assets.bin'
+
+FONT = 'InputSansNarrow-Thin.ttf'
+
+# Every string the screens draw, by (font file, size)
+TEXTS = {
+    (FONT, 12): (["GRABAR", "CONFIG", "2/4", "3/4", "4/4", "6/8"]
+                 + [f"{bpm} BPM" for bpm in range(40, 201)]
+                 + [f"{bars} BARS" for bars in range(1, 17)]),
+    (FONT, 30): [str(beat) for beat in range(1, 7)],  # Countdown numbers
+}
+
+def text_key(font_file, size, text):
+    return f"{font_file}|{size}|{text}"
+
+# Files the bundle is built from, with what they looked like at build time
+def sources(base_dir):
+    paths = sorted(glob.glob(os.path.join(base_dir, 'screens', '*.png')))
+    paths += [os.path.join(base_dir, 'fonts', font_file) for font_file in sorted({font_file for font_file, _ in TEXTS})]
+    stamps = {}
+    for path in paths:
+        stat = os.stat(path)
+        stamps[os.path.relpath(path, base_dir)] = [stat.st_size, stat.st_mtime_ns]
+    return stamps
+
+def build(base_dir, path=None):
+    path = path or os.path.join(base_dir, BUNDLE_FILE)
+    index = {"sources": sources(base_dir), "screens": {}, "texts": {}}
+    data = bytearray()
+
+    def add(image):
+        offset = len(data)
+        data.extend(image.tobytes())
+        return [offset, image.width, image.height]
+
+    for screen in sorted(glob.glob(os.path.join(base_dir, 'screens', '*.png'))):
+        index["screens"][os.path.basename(screen)] = add(Image.open(screen).convert('1'))
+    for (font_file, size), texts in TEXTS.items():
+        font = load_font(os.path.join(base_dir, 'fonts', font_file), size)
+        for text in texts:
+            mask, bbox = render_text(font, text)
+            index["texts"][text_key(font_file, size, text)] = add(mask) + list(bbox)
+
+    header = json.dumps(index, separators=(',', ':')).encode()
+    temp = path + '.tmp'
+    with open(temp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        f.write(data)
+    os.replace(temp, path)  # A half-written bundle is never picked up
+    return path
+
+class AssetBundle:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, length = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            self.data.close()
+            raise ValueError(f"{path} is not a version {VERSION} asset bundle")
+        start = HEADER.size + length
+        self.index = json.loads(self.data[HEADER.size:start])
+        self.start = start
+        self.screens = {}
+        self.texts = {}
+
+    def fresh(self, base_dir):
+        try:
+            return self.index["sources"] == sources(base_dir)
+        except OSError:
+            return False
+
+    def decode(self, offset, width, height):
+        start = self.start + offset
+        return Image.frombytes('1', (width, height), self.data[start:start + (width + 7) // 8 * height])
+
+    def has(self, name):
+        return name in self.index["screens"]
+
+    # Portrait screen from screens/, by file name
+    def screen(self, name):
+        image = self.screens.get(name)
+        if image is None:
+            image = self.screens[name] = self.decode(*self.index["screens"][name])
+        return image
+
+    # Landscape text mask and bbox as layout.text_mask gives them, None if it was not bundled
+    def text(self, font, text):
+        key = text_key(os.path.basename(font.path), font.size, text)
+        found = self.texts.get(key)
+        if found is None:
+            entry = self.index["texts"].get(key)
+            if entry is None:
+                return None
+            found = self.texts[key] = (self.decode(*entry[:3]), tuple(entry[3:]))
+        return found
+
+# Same interface straight from the files, when there is no usable bundle
+class LooseAssets:
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self.screens = {}
+
+    def has(self, name):
+        return os.path.exists(os.path.join(self.base_dir, 'screens', name))
+
+    def screen(self, name):
+        image = self.screens.get(name)
+        if image is None:
+            image = self.screens[name] = Image.open(os.path.join(self.base_dir, 'screens', name)).convert('1')
+        return image
+
+    def text(self, font, text):
+        return None
+
+# Map the bundle in base_dir, rebuilding it first if it is missing or out of date
+def open_assets(base_dir):
+    path = os.path.join(base_dir, BUNDLE_FILE)
+    try:
+        bundle = AssetBundle(path)
+        if bundle.fresh(base_dir):
+            return bundle
+        bundle.data.close()
+    except (OSError, ValueError):
+        pass
+    try:
+        return AssetBundle(build(base_dir, path))
+    except OSError as error:
+        print(f"Could not build the asset bundle ({error}), loading screens from their files")
+        return LooseAssets(base_dir)
+
+# Beat screens per time signature, loaded from the assets when a time signature is used
+# Time signatures with missing screens are left out
+class ScreenSet:
+    def __init__(self, assets, names):
+        self.assets = assets
+        self.names = {key: screens for key, screens in names.items() if all(assets.has(name) for name in screens)}
+
+    def __contains__(self, key):
+        return key in self.names
+
+    def __getitem__(self, key):
+        return [self.assets.screen(name) for name in self.names[key]]
+
+    def keys(self):
+        return self.names.keys()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the packed screen and text bundle")
+    parser.add_argument("--base-dir", default=os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument("--out", help="Bundle path, assets.bin in the base directory by default")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    path = build(args.base_dir, args.out)
+    elapsed = time.perf_counter() - start
+    bundle = AssetBundle(path)
+    print(f"Built {path}: {len(bundle.index['screens'])} screens, {len(bundle.index['texts'])} texts, "
+          f"{os.path.getsize(path)} bytes in {elapsed * 1000:.0f} ms")
@@ -0,0 +1,149 @@
+import argparse
+import csv
+import functools
+import itertools
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+# CPU scaling benchmark for the loop station
+# Sweeps track count, buffersize, loop length and the per-track effect chain. Every
+# configuration renders on pyo's offline server in its own process, so peak memory is
+# per configuration, and reports:
+#   dsp_load     CPU seconds spent per second of audio (1.0 = a full core in realtime)
+#   callback_ms  Time spent in the Python callbacks the audio thread calls into
+#   maxrss_kb    Peak resident memory of the process
+# Results are written as CSV or JSON so runs from different commits can be diffed.
+#   python bench.py --tracks 1 2 4 6 --buffersizes 256 512 2048 --format csv --out before.csv
+
+FIELDS = ["tracks", "channels", "buffersize", "bpm", "bars", "loop_seconds", "effects", "audio_seconds",
+          "dsp_load", "callback_ms", "callbacks", "maxrss_kb"]
+
+# Engine methods that run as TrigFunc callbacks on the audio thread
+CALLBACKS = {
+    "Metronome": ["finish"],
+    "BoundaryGate": ["fired"],
+    "Track": ["start_recording", "finish_recording"],
+}
+
+callback_time = 0.0
+callback_count = 0
+
+def timed(method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        global callback_time, callback_count
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            callback_time += time.perf_counter() - start
+            callback_count += 1
+    return wrapper
+
+def run_config(config):
+    from pyo import Server, Noise
+    import loopstation
+
+    for class_name, names in CALLBACKS.items():
+        cls = getattr(loopstation, class_name)
+        for name in names:
+            setattr(cls, name, timed(getattr(cls, name)))
+
+    channels = config["channels"]
+    s = Server(sr=config["sr"], buffersize=config["buffersize"], audio='offline', nchnls=channels, ichnls=channels).boot()
+    config_option_values = {
+        "BPM": config["bpm"],
+        "TIME SIGNATURE": "4/4",
+        "TOTAL BARS": config["bars"]
+    }
+    input_bus = Noise([0.3] * channels)
+    loop_station = loopstation.LoopStation(s, config_option_values, latency=0.0, num_slots=config["tracks"],
+                                           input_bus=input_bus, effects=config["effects"])
+    loop_station.init_master_track()
+    for key in range(2, config["tracks"] + 1):
+        loop_station.init_track(key)
+
+    # Count-in, the master recording pass, then the requested number of full loops
+    metronome = loop_station.metronome
+    audio_seconds = metronome.interval * metronome.beats_per_bar + metronome.duration * (1 + config["loops"])
+
+    render_file = os.path.join(tempfile.gettempdir(), f"bench_{os.getpid()}.wav")
+    s.recordOptions(dur=audio_seconds, filename=render_file)
+    cpu_start = time.process_time()
+    s.start()  # Blocks until the render is done
+    cpu = time.process_time() - cpu_start
+    os.remove(render_file)
+
+    return {
+        "tracks": config["tracks"],
+        "channels": channels,
+        "buffersize": config["buffersize"],
+        "bpm": config["bpm"],
+        "bars": config["bars"],
+        "loop_seconds": round(metronome.duration, 3),
+        "effects": config["effects"],
+        "audio_seconds": round(audio_seconds, 3),
+        "dsp_load": round(cpu / audio_seconds, 5),
+        "callback_ms": round(callback_time * 1000, 3),
+        "callbacks": callback_count,
+        "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+def run_isolated(config):
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), "--run", json.dumps(config)],
+                            capture_output=True, text=True)
+    # pyo prints its own messages on stdout, the result is the last line
+    lines = result.stdout.strip().splitlines()
+    if not lines or not lines[-1].startswith("{"):
+        print(f"Configuration failed: {config}\n{result.stderr}", file=sys.stderr)
+        return None
+    return json.loads(lines[-1])
+
+def write_results(rows, fmt, out):
+    f = open(out, "w", newline="") if out else sys.stdout
+    if fmt == "json":
+        json.dump(rows, f, indent=2)
+        f.write("\n")
+    else:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    if out:
+        f.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Loop station CPU scaling benchmark")
+    parser.add_argument("--tracks", type=int, nargs="+", default=[1, 2, 3, 4, 5, 6])
+    parser.add_argument("--channels", type=int, nargs="+", choices=[1, 2], default=[2])
+    parser.add_argument("--buffersizes", type=int, nargs="+", default=[256, 512, 2048])
+    parser.add_argument("--bpms", type=int, nargs="+", default=[120])
+    parser.add_argument("--bars", type=int, nargs="+", default=[2])
+    parser.add_argument("--effects", choices=["off", "on", "both"], default="both")
+    parser.add_argument("--loops", type=int, default=2, help="Full loops rendered after the master is recorded")
+    parser.add_argument("--sr", type=int, default=48000)
+    parser.add_argument("--format", choices=["csv", "json"], default="csv")
+    parser.add_argument("--out", help="Write the results here instead of stdout")
+    parser.add_argument("--run", help=argparse.SUPPRESS)  # Single configuration, used by the child processes
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_config(json.loads(args.run))), flush=True)
+        sys.exit(0)
+
+    effects = {"off": [False], "on": [True], "both": [False, True]}[args.effects]
+    rows = []
+    for tracks, channels, buffersize, bpm, bars, fx in itertools.product(args.tracks, args.channels, args.buffersizes,
+                                                                           args.bpms, args.bars, effects):
+        config = {"tracks": tracks, "channels": channels, "buffersize": buffersize, "bpm": bpm, "bars": bars, "effects": fx,
+                  "loops": args.loops, "sr": args.sr}
+        row = run_isolated(config)
+        if row is not None:
+            rows.append(row)
+            print(f"{tracks} tracks, {channels} ch, buffersize {buffersize}, {bpm} BPM x {bars} bars, effects {fx}: "
+                  f"dsp load {row['dsp_load']:.4f}", file=sys.stderr)
+    write_results(rows, args.format, args.out)
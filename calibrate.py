@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+from pyo import *
+
+# Round-trip latency calibration
+# Plays a one-sample impulse and records the input on the same sample, so the index of
+# the loudest captured sample is the round-trip delay in samples. Results are stored per
+# (input device, output device, sr, buffersize) and looked up by the looper at startup.
+
+PROFILE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "latency_profiles.json")
+
+def profile_key(input_device, output_device, sr, buffersize):
+    return f"{input_device}:{output_device}:{sr}:{buffersize}"
+
+def load_profiles(path=PROFILE_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_profile(key, samples, sr, path=PROFILE_FILE):
+    profiles = load_profiles(path)
+    profiles[key] = {"samples": samples, "latency": samples / sr}
+    with open(path, "w") as f:
+        json.dump(profiles, f, indent=2, sort_keys=True)
+
+# Latency in seconds for a device setup, or the default if it was never calibrated
+def load_latency(input_device, output_device, sr, buffersize, default, path=PROFILE_FILE):
+    profile = load_profiles(path).get(profile_key(input_device, output_device, sr, buffersize))
+    if profile is None:
+        print(f"No latency profile for this audio setup, using {default} s")
+        return default
+    return profile["latency"]
+
+class LatencyProbe:
+    def __init__(self, loopback=None, max_latency=1.0, threshold=0.01):
+        self.threshold = threshold
+        self.trig = Trig()
+        self.impulse = Sig(self.trig).out()
+        # Physical loopback cable by default, or any callable standing in for the device
+        self.input = Input(0) if loopback is None else loopback(self.impulse)
+        self.table = NewTable(length=max_latency, chnls=1)
+        self.recorder = TrigTableRec(self.input, trig=self.trig, table=self.table)
+
+    # Round-trip delay in samples, None if the impulse never came back
+    def result(self):
+        samples = self.table.getTable()
+        peak = max(range(len(samples)), key=lambda i: abs(samples[i]))
+        if abs(samples[peak]) < self.threshold:
+            return None
+        return peak
+
+def calibrate(server, loopback=None, max_latency=1.0, offline=False):
+    probe = LatencyProbe(loopback, max_latency)
+    if offline:
+        server.recordOptions(dur=max_latency + 0.1, filename=os.path.join(tempfile.gettempdir(), "calibrate.wav"))
+        server.start()  # Blocks until the render is done
+    else:
+        server.start()
+        time.sleep(max_latency + 0.1)
+        server.stop()
+    return probe.result()
+
+def self_test(sr, buffersize, delay_samples):
+    # Offline server with a delay line as the "device", so no hardware is needed
+    s = Server(sr=sr, buffersize=buffersize, audio='offline', nchnls=1, ichnls=1).boot()
+    delay = (delay_samples + 0.5) / sr  # Half a sample of margin against float truncation
+    measured = calibrate(s, lambda sig: SDelay(sig, delay=delay, maxdelay=delay + 1), offline=True)
+    s.shutdown()
+    print(f"Synthetic delay: {delay_samples} samples, measured: {measured}")
+    return measured == delay_samples
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Round-trip latency calibration")
+    parser.add_argument("--input-device", type=int, default=1)
+    parser.add_argument("--output-device", type=int, default=0)
+    parser.add_argument("--sr", type=int, default=48000)
+    parser.add_argument("--buffersize", type=int, default=2048)
+    parser.add_argument("--self-test", type=int, metavar="SAMPLES",
+                        help="Measure a synthetic delay on the offline server instead of the sound card")
+    args = parser.parse_args()
+
+    if args.self_test is not None:
+        raise SystemExit(0 if self_test(args.sr, args.buffersize, args.self_test) else 1)
+
+    s = Server(sr=args.sr, buffersize=args.buffersize, audio='pa', nchnls=1, ichnls=1, duplex=1)
+    s.setInputDevice(args.input_device)
+    s.setOutputDevice(args.output_device)
+    s.boot()
+    samples = calibrate(s)
+    if samples is None:
+        print("No impulse came back, check the loopback cable and input gain")
+        raise SystemExit(1)
+
+    key = profile_key(args.input_device, args.output_device, args.sr, args.buffersize)
+    save_profile(key, samples, args.sr)
+    print(f"Round-trip latency for {key}: {samples} samples ({samples / args.sr * 1000:.1f} ms)")
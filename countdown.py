@@ -0,0 +1,43 @@
+from display import pack_pages
+from layout import LandscapeCanvas, to_landscape
+
+# Countdown frame atlas
+# Every countdown frame is known from the time signature: the screen for the beat in the bar,
+# with or without a number on top. When the time signature changes all of them are drawn
+# once and packed into SH1106 pages, so showing a beat is a single display_pages() push
+# with no compositing, font work or rotation on the beat.
+class CountdownAtlas:
+    def __init__(self, device, beat_images, font):
+        self.device = device
+        self.beat_images = beat_images  # Portrait beat screens per time signature
+        self.font = font
+        self.frames = {}  # (time signature, beat, label) -> packed pages
+        self.time_signature = None
+
+    # Beat screens with every number from 1 to the beats in a bar, plus without a number
+    def build(self, time_signature):
+        if time_signature == self.time_signature:
+            return
+        images = [to_landscape(image) for image in self.beat_images[time_signature]]
+        frames = {}
+        for beat, image in enumerate(images, start=1):
+            for label in [None] + list(range(1, len(images) + 1)):
+                frames[(time_signature, beat, label)] = self.render(image, label)
+        self.frames = frames
+        self.time_signature = time_signature
+
+    def render(self, background, label):
+        canvas = LandscapeCanvas(background)
+        if label is not None:
+            text = str(label)
+            bbox = canvas.textbbox(text, self.font)
+            text_width = bbox[2] - bbox[0]
+            text_height = bbox[3] - bbox[1]
+            text_x = (64 - text_width) // 2
+            text_y = (128 - text_height) // 2
+            canvas.text((text_x, text_y), text, self.font, fill="white")  # White text
+        return pack_pages(self.device.preprocess(canvas.image))
+
+    def frame(self, time_signature, beat, label=None):
+        self.build(time_signature)
+        return self.frames[(time_signature, beat, label)]
@@ -0,0 +1,122 @@
+import threading
+from PIL import Image
+
+# Event-driven display refresh
+# Input handlers publish the latest screen state; the display thread wakes up only then,
+# renders the newest state and drops any state that was superseded while it was busy
+class DisplayController:
+    def __init__(self, device, render, lock=None):
+        self.device = device
+        self.render = render  # Maps a screen state to a landscape frame (or None)
+        self.lock = lock if lock is not None else threading.Lock()  # Guards the device
+        self.condition = threading.Condition()
+        self.pending = None
+        self.last_state = None
+        self.frames_pushed = 0
+        self.frames_dropped = 0
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def publish(self, state):
+        with self.condition:
+            if self.pending is not None:
+                self.frames_dropped += 1  # Previous state was never drawn
+            self.pending = state
+            self.condition.notify()
+
+    # Draw the state even if it is the last one drawn, e.g. after something else used the screen
+    def refresh(self, state):
+        self.last_state = None
+        self.publish(state)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None:
+                    self.condition.wait()
+                state = self.pending
+                self.pending = None
+
+            # Nothing to do if the screen would not change
+            if state == self.last_state:
+                continue
+
+            frame = self.render(state)
+            if frame is None:
+                continue
+
+            with self.lock:
+                self.device.display(frame)
+            self.last_state = state
+            self.frames_pushed += 1
+
+# Reverse the bit order of a byte: PIL packs pixels MSB first, SH1106 pages put the LSB on top
+_REVERSED_BITS = bytes(int(f"{i:08b}"[::-1], 2) for i in range(256))
+
+# Pack a 1-bit landscape image into SH1106 pages
+# The result is page-major: byte (page * width + x) holds pixels (x, 8 * page) .. (x, 8 * page + 7)
+def pack_pages(image):
+    columns = image.transpose(Image.TRANSPOSE).tobytes().translate(_REVERSED_BITS)
+    pages = image.height // 8
+    return b"".join(columns[page::pages] for page in range(pages))
+
+# Framebuffer diffing layer for the luma sh1106 device
+# Keeps the last transmitted frame and only sends the pages, and the column range within
+# each page, that changed since then
+class DeltaDevice:
+    def __init__(self, device, column_offset=2):
+        self.device = device
+        self.column_offset = column_offset  # The SH1106 has 132 columns, the panel starts at column 2
+        self.pages = device.height // 8
+        self.last_frame = None
+
+        # Bytes sent over I2C (page address commands plus pixel data)
+        self.last_bytes = 0
+        self.total_bytes = 0
+        self.frames = 0
+
+    def display(self, image):
+        self.display_pages(pack_pages(self.device.preprocess(image)))
+
+    def display_pages(self, frame):
+        width = self.device.width
+        sent = 0
+        for page in range(self.pages):
+            start = page * width
+            new = frame[start:start + width]
+            if self.last_frame is None:
+                first, last = 0, width - 1
+            else:
+                old = self.last_frame[start:start + width]
+                if new == old:
+                    continue  # Page unchanged, skip it entirely
+
+                # Narrow the update down to the changed column range
+                first = 0
+                while new[first] == old[first]:
+                    first += 1
+                last = width - 1
+                while new[last] == old[last]:
+                    last -= 1
+
+            column = first + self.column_offset
+            self.device.command(0xB0 | page, column & 0x0F, 0x10 | (column >> 4))
+            self.device.data(list(new[first:last + 1]))
+            sent += 3 + last - first + 1
+
+        self.last_frame = frame
+        self.last_bytes = sent
+        self.total_bytes += sent
+        self.frames += 1
+
+    def clear(self):
+        self.display(Image.new(self.device.mode, self.device.size))
+
+    # Force the next frame to be sent in full (e.g. after the panel was reset)
+    def invalidate(self):
+        self.last_frame = None
+
+    # Everything else (show, hide, contrast, ...) goes straight to the device
+    def __getattr__(self, name):
+        return getattr(self.device, name)
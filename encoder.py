@@ -1,6 +1,5 @@
 import time
-import RPi.GPIO as GPIO
-from gpiozero import Button
+from hal import GPIO, Button
 from signal import pause
 
 # Define the GPIO pins for the rotary encoder
@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+from PIL import Image
+from display import pack_pages
+
+# Hardware abstraction layer
+# The scripts import GPIO, Button, open_display() and the audio driver name from here
+# instead of RPi.GPIO, gpiozero and luma directly. LOOPER_BACKEND=fake swaps in in-memory
+# fakes that record pin edges and display writes, so the whole UI runs on any Linux box.
+# LOOPER_AUDIO overrides the pyo audio driver ("manual" with the fake backend, see AudioClock).
+
+BACKEND = os.environ.get("LOOPER_BACKEND", "pi")
+AUDIO = os.environ.get("LOOPER_AUDIO", "manual" if BACKEND == "fake" else "pa")
+
+class FakePin:
+    def __init__(self, number):
+        self.number = number
+
+# Stand-in for gpiozero.Button on top of the simulated GPIO
+class FakeButton:
+    def __init__(self, pin, pull_up=True, bounce_time=None):
+        self.pin = FakePin(pin)
+        self.pull_up = pull_up
+        self.when_pressed = None
+        self.when_released = None
+        GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP if pull_up else GPIO.PUD_DOWN)
+        GPIO.add_event_detect(pin, GPIO.BOTH, callback=self.handle_edge)
+
+    @property
+    def is_pressed(self):
+        return GPIO.input(self.pin.number) == (GPIO.LOW if self.pull_up else GPIO.HIGH)
+
+    def handle_edge(self, channel):
+        callback = self.when_pressed if self.is_pressed else self.when_released
+        if callback is not None:
+            callback()
+
+    def close(self):
+        GPIO.remove_event_detect(self.pin.number)
+
+# Stand-in for the luma sh1106 device
+# Decodes the page/column commands into its own framebuffer, like the controller would,
+# and records (timestamp, bytes) for every write so display traffic can be measured
+class FakeDisplay:
+    def __init__(self, width=128, height=64, column_offset=2):
+        self.width = width
+        self.height = height
+        self.size = (width, height)
+        self.mode = '1'
+        self.column_offset = column_offset
+        self.ram = bytearray(132 * (height // 8))  # SH1106 display RAM, 132 columns per page
+        self.page = 0
+        self.column = 0
+        self.visible = True
+        self.lock = threading.Lock()
+        self.writes = []  # (timestamp, bytes) for every command or data transfer
+        self.frames = []  # (timestamp, image) for every full frame passed to display()
+
+    def preprocess(self, image):
+        return image
+
+    def command(self, *cmd):
+        with self.lock:
+            for byte in cmd:
+                if byte & 0xF0 == 0xB0:
+                    self.page = byte & 0x0F
+                elif byte & 0xF0 == 0x00:
+                    self.column = (self.column & 0xF0) | byte
+                elif byte & 0xF0 == 0x10:
+                    self.column = (self.column & 0x0F) | ((byte & 0x0F) << 4)
+            self.writes.append((time.monotonic(), len(cmd)))
+
+    def data(self, values):
+        with self.lock:
+            start = self.page * 132 + self.column
+            self.ram[start:start + len(values)] = bytes(values)
+            self.column += len(values)
+            self.writes.append((time.monotonic(), len(values)))
+
+    # Full-frame path, for scripts that draw on the raw device
+    def display(self, image):
+        with self.lock:
+            self.frames.append((time.monotonic(), image.copy()))
+        frame = pack_pages(image)
+        for page in range(self.height // 8):
+            self.command(0xB0 | page, self.column_offset & 0x0F, 0x10 | (self.column_offset >> 4))
+            self.data(frame[page * self.width:(page + 1) * self.width])
+
+    # What the panel currently shows, rebuilt from display RAM
+    def image(self):
+        image = Image.new('1', self.size)
+        pixels = image.load()
+        with self.lock:
+            for page in range(self.height // 8):
+                row = self.ram[page * 132 + self.column_offset:page * 132 + self.column_offset + self.width]
+                for x, byte in enumerate(row):
+                    for bit in range(8):
+                        if byte >> bit & 1:
+                            pixels[x, page * 8 + bit] = 1
+        return image
+
+    def show(self):
+        self.visible = True
+
+    def hide(self):
+        self.visible = False
+
+    def clear(self):
+        self.display(Image.new(self.mode, self.size))
+
+    def contrast(self, level):
+        pass
+
+    def cleanup(self):
+        pass
+
+# Drives a pyo Server booted with audio="manual" in realtime from a thread
+# Stands in for the sound card callback and records how long every buffer took
+class AudioClock:
+    def __init__(self, server, sr, buffersize):
+        self.server = server
+        self.period = buffersize / sr
+        self.running = False
+        self.buffers = 0
+        self.late = 0  # Buffers that finished after their deadline (an xrun on real hardware)
+        self.process_time = 0.0
+        self.max_process_time = 0.0
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+
+    def run(self):
+        deadline = time.perf_counter()
+        while self.running:
+            start = time.perf_counter()
+            self.server.process()
+            elapsed = time.perf_counter() - start
+            self.buffers += 1
+            self.process_time += elapsed
+            self.max_process_time = max(self.max_process_time, elapsed)
+
+            deadline += self.period
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self.late += 1
+
+if BACKEND == "fake":
+    from sim_gpio import SimulatedGPIO
+    GPIO = SimulatedGPIO()
+    Button = FakeButton
+else:
+    import RPi.GPIO as GPIO
+    from gpiozero import Button
+
+def open_display(port=1, address=0x3C):
+    if BACKEND == "fake":
+        return FakeDisplay()
+    from luma.core.interface.serial import i2c
+    from luma.oled.device import sh1106
+    return sh1106(i2c(port=port, address=address))
+
+# Start the server; with the manual driver an AudioClock plays the part of the sound card
+def start_audio(server, sr, buffersize):
+    server.start()
+    if AUDIO != "manual":
+        return None
+    clock = AudioClock(server, sr, buffersize)
+    clock.start()
+    return clock
@@ -0,0 +1,166 @@
+import collections
+import threading
+import time
+
+# Undo/redo history for loop tables
+# Every record pass writes the table from start to end, so the keeper thread copies each
+# block just before the recorder's write head gets to it (copy on write) instead of
+# snapshotting the whole table. When the pass is over, blocks that came out unchanged are
+# dropped and blocks that were silent before are kept as None, so a first take costs
+# nothing to undo. Undo and redo swap the stored blocks with the table's in place, while
+# it keeps playing; the oldest entries are evicted to stay under max_bytes.
+
+BLOCK = 4096  # Samples per block
+AHEAD = 8  # Blocks copied ahead of the write head
+SAMPLE_BYTES = 4
+
+class TableHistory:
+    def __init__(self, table, write_head, max_bytes):
+        self.table = table
+        self.write_head = write_head  # Recorder position in samples, TrigTableRec['time']
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.undo_entries = collections.deque()  # [(chnl, block, bytes or None)], oldest first
+        self.redo_entries = []
+        self.pending = None  # Pre-images of the pass being recorded
+        self.pending_bytes = 0
+        self.captured = 0  # Blocks of the pending pass copied so far
+        self.started = False
+        self.finished = False
+        self.zeros = bytes(BLOCK * SAMPLE_BYTES)
+
+        # Statistics
+        self.lost = 0  # Passes that could not be kept, see advance()
+
+    def nbytes(self):
+        entries = list(self.undo_entries) + self.redo_entries
+        return sum(len(data) for entry in entries for _, _, data in entry if data is not None) + self.pending_bytes
+
+    def can_undo(self):
+        return bool(self.undo_entries)
+
+    def can_redo(self):
+        return bool(self.redo_entries)
+
+    # A pass is armed; nothing is copied until the keeper sees the write head coming
+    def begin(self):
+        with self.lock:
+            if self.finished:
+                self.commit()
+            self.pending = []
+            self.pending_bytes = 0
+            self.captured = 0
+            self.started = False
+            self.finished = False
+
+    # Called from the audio thread, the keeper does the work
+    def start(self):
+        self.started = True
+
+    def finish(self):
+        self.finished = True
+
+    def blocks(self):
+        return (self.table.getSize() + BLOCK - 1) // BLOCK
+
+    def read(self, chnl, block):
+        view = memoryview(self.table.getBuffer(chnl)).cast('B')
+        data = bytes(view[block * BLOCK * SAMPLE_BYTES:(block + 1) * BLOCK * SAMPLE_BYTES])
+        view.release()
+        return data
+
+    # Block contents as stored in an entry, None for silence
+    def stored(self, chnl, block):
+        data = self.read(chnl, block)
+        return None if data == self.zeros[:len(data)] else data
+
+    def write(self, chnl, block, data):
+        view = memoryview(self.table.getBuffer(chnl)).cast('B')
+        start = block * BLOCK * SAMPLE_BYTES
+        end = min(start + BLOCK * SAMPLE_BYTES, len(view))
+        view[start:end] = self.zeros[:end - start] if data is None else data
+        view.release()
+
+    # Copy the blocks the recorder is about to overwrite, or commit a finished pass
+    def advance(self):
+        with self.lock:
+            if self.pending is None:
+                return
+            if self.finished:
+                self.commit()
+                return
+            head = 0
+            if self.started:
+                head = int(self.write_head.get())
+                if head >= self.table.getSize() - 1:
+                    head = 0  # Still the end of the previous pass
+            if head and head // BLOCK >= self.captured:
+                self.drop("Undo history fell behind the recording, dropped this pass")
+                return
+            upto = min(head // BLOCK + AHEAD, self.blocks())
+            while self.captured < upto:
+                for chnl in range(len(self.table)):
+                    data = self.stored(chnl, self.captured)
+                    self.pending.append((chnl, self.captured, data))
+                    self.pending_bytes += len(data) if data is not None else 0
+                self.captured += 1
+            if self.pending_bytes > self.max_bytes:
+                self.drop("Pass is too large for the undo history, dropped it")
+
+    def drop(self, message):
+        self.pending = None
+        self.pending_bytes = 0
+        self.finished = False
+        self.lost += 1
+        print(message)
+
+    def commit(self):
+        self.finished = False
+        if self.pending is None:
+            return  # The pass was dropped
+        # Only the blocks the pass actually changed are kept
+        entry = [(chnl, block, data) for chnl, block, data in self.pending if self.stored(chnl, block) != data]
+        self.pending = None
+        self.pending_bytes = 0
+        if entry:
+            self.undo_entries.append(entry)
+            self.redo_entries = []
+        while self.undo_entries and self.nbytes() > self.max_bytes:
+            self.undo_entries.popleft()
+
+    def swap(self, entry):
+        swapped = []
+        for chnl, block, data in entry:
+            swapped.append((chnl, block, self.stored(chnl, block)))
+            self.write(chnl, block, data)
+        return swapped
+
+    # Put back the table as it was before the last pass, returns False if there is none
+    def undo(self):
+        with self.lock:
+            if not self.undo_entries or self.pending is not None:
+                return False
+            self.redo_entries.append(self.swap(self.undo_entries.pop()))
+            return True
+
+    def redo(self):
+        with self.lock:
+            if not self.redo_entries or self.pending is not None:
+                return False
+            self.undo_entries.append(self.swap(self.redo_entries.pop()))
+            return True
+
+# Advances every track's history from one thread
+class HistoryKeeper:
+    def __init__(self, period=0.02):
+        self.period = period
+        self.histories = []
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        while True:
+            for history in list(self.histories):
+                history.advance()
+            time.sleep(self.period)
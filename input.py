@@ -1,6 +1,5 @@
-from gpiozero import Button
 from signal import pause
-import RPi.GPIO as GPIO
+from hal import GPIO, Button
 import time
 
 # Define the GPIO pins for rows and columns of the matrix keypad
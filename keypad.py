@@ -0,0 +1,78 @@
+import queue
+import threading
+import time
+
+# Non-blocking matrix keypad scanner
+# The row callbacks only wake the scanner thread up. The scanner drives one column at a time,
+# reads every row, debounces each key on its own timer and queues (key, pressed, timestamp)
+# events, so several keys can be held at once and nothing sleeps in the callback thread.
+class KeypadScanner:
+    def __init__(self, gpio, rows, col_pins, key_map, debounce_time=0.05, scan_interval=0.002):
+        self.gpio = gpio  # RPi.GPIO or any backend with the same interface (drives the columns)
+        self.rows = rows  # gpiozero Buttons on the row pins, with pull-downs
+        self.col_pins = col_pins
+        self.key_map = key_map
+        self.keys = sorted(set(key_map.values()))
+        self.debounce_time = debounce_time
+        self.scan_interval = scan_interval
+
+        self.events = queue.Queue()
+        self.wake = threading.Event()
+        self.pressed = set()  # Debounced keys that are currently down
+        self.changing = {}  # Key -> time its raw state started to differ from the debounced one
+
+    def start(self):
+        for row in self.rows:
+            row.when_pressed = self.wake.set
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def scan(self):
+        down = set()
+
+        # Disable all column outputs
+        for col in self.col_pins:
+            self.gpio.output(col, self.gpio.LOW)
+
+        # Drive one column at a time and read every row
+        for col in self.col_pins:
+            self.gpio.output(col, self.gpio.HIGH)
+            for row in self.rows:
+                if row.is_pressed:
+                    key = self.key_map.get((row.pin.number, col), None)
+                    if key:
+                        down.add(key)
+            self.gpio.output(col, self.gpio.LOW)
+
+        # Re-enable all column outputs so the next press raises a row again
+        for col in self.col_pins:
+            self.gpio.output(col, self.gpio.HIGH)
+
+        return down
+
+    def update(self, down, now):
+        for key in self.keys:
+            is_down = key in down
+            if is_down == (key in self.pressed):
+                self.changing.pop(key, None)  # Bounced back before it settled
+                continue
+
+            since = self.changing.setdefault(key, now)
+            if now - since >= self.debounce_time:
+                del self.changing[key]
+                if is_down:
+                    self.pressed.add(key)
+                else:
+                    self.pressed.discard(key)
+                self.events.put((key, is_down, since))
+
+    def run(self):
+        while True:
+            self.wake.wait()
+            self.wake.clear()
+
+            # Keep scanning while a key is held or still settling, then go back to sleep
+            while True:
+                self.update(self.scan(), time.monotonic())
+                if not self.pressed and not self.changing:
+                    break
+                time.sleep(self.scan_interval)
@@ -0,0 +1,61 @@
+from functools import lru_cache
+from PIL import Image, ImageDraw
+
+# Screens are laid out in portrait (64x128) but the SH1106 is natively landscape (128x64)
+PORTRAIT_WIDTH = 64
+PORTRAIT_HEIGHT = 128
+
+# Scratch surface used only to measure text the same way a portrait ImageDraw would
+_measure = ImageDraw.Draw(Image.new('1', (1, 1)))
+
+# Prerendered masks, e.g. from the asset bundle: lookup(font, text) -> (mask, bbox) or None
+_prerendered = None
+
+def use_prerendered(lookup):
+    global _prerendered
+    _prerendered = lookup
+    text_mask.cache_clear()
+
+# Render a string as a mask already rotated into landscape
+def render_text(font, text):
+    bbox = _measure.textbbox((0, 0), text, font=font)
+    mask = Image.new('1', (max(bbox[2], 1), max(bbox[3], 1)), 0)
+    ImageDraw.Draw(mask).text((0, 0), text, font=font, fill=1)
+    return mask.transpose(Image.ROTATE_270), bbox
+
+# Each string is looked up or rendered once, then kept
+@lru_cache(maxsize=512)
+def text_mask(font, text):
+    if _prerendered is not None:
+        found = _prerendered(font, text)
+        if found is not None:
+            return found
+    return render_text(font, text)
+
+# Rotate a full portrait image (e.g. a beat screen) once, at load time
+def to_landscape(image):
+    return image.transpose(Image.ROTATE_270)
+
+# Drawing surface that takes portrait coordinates and writes straight into the
+# device's landscape framebuffer, so frames never need a full-image rotate
+class LandscapeCanvas:
+    def __init__(self, background=None):
+        if background is None:
+            self.image = Image.new('1', (PORTRAIT_HEIGHT, PORTRAIT_WIDTH), "black")
+        else:
+            self.image = background.copy()  # Background must already be landscape
+        self.draw = ImageDraw.Draw(self.image)
+
+    # Portrait point (x, y) lands on landscape (PORTRAIT_HEIGHT - 1 - y, x)
+    def rectangle(self, box, fill="white"):
+        x0, y0, x1, y1 = box
+        self.draw.rectangle([PORTRAIT_HEIGHT - 1 - y1, x0, PORTRAIT_HEIGHT - 1 - y0, x1], fill=fill)
+
+    def textbbox(self, text, font):
+        return text_mask(font, text)[1]
+
+    def text(self, xy, text, font, fill="white"):
+        mask, bbox = text_mask(font, text)
+        x, y = xy
+        # The mask's portrait height is its landscape width
+        self.image.paste(fill, (PORTRAIT_HEIGHT - y - mask.width, x), mask)
@@ -0,0 +1,105 @@
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+# Load test for the full looper application on the fake hardware backend
+# Boots looper.py with LOOPER_BACKEND=fake, then turns the simulated encoder and presses
+# keypad keys for a while and reports input latency, display traffic and audio timing.
+# Runs on any Linux machine:  python loadtest.py --duration 20 --detents 30 --presses 4
+
+os.environ["LOOPER_BACKEND"] = "fake"
+
+from rotary_bench import CW_SEQUENCE
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+def turn_encoder(gpio, clk_pin, dt_pin, detents_per_second, stop, rng):
+    # One detent at a time, in a random direction, on an absolute schedule
+    interval = 1 / (detents_per_second * len(CW_SEQUENCE))
+    next_time = time.perf_counter()
+    while not stop.is_set():
+        sequence = CW_SEQUENCE if rng.random() < 0.5 else [(dt, clk) for clk, dt in CW_SEQUENCE]
+        for clk, dt in sequence:
+            next_time += interval
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            gpio.set_input(clk_pin, clk)
+            gpio.set_input(dt_pin, dt)
+
+def press_keys(gpio, key_map, presses_per_second, hold_time, pressed_at, stop, rng):
+    switches = {key: (col, row) for (row, col), key in key_map.items()}
+    while not stop.wait(rng.expovariate(presses_per_second)):
+        key = rng.choice(sorted(switches))
+        col, row = switches[key]
+        pressed_at[key] = time.monotonic()
+        gpio.connect(col, row)
+        time.sleep(hold_time)
+        gpio.disconnect(col, row)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Looper load test on the fake hardware backend")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--detents", type=float, default=20, help="Encoder detents per second")
+    parser.add_argument("--presses", type=float, default=2, help="Key presses per second")
+    parser.add_argument("--hold", type=float, default=0.1, help="How long each key is held, in seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    import looper
+    from hal import GPIO
+
+    # Encoder at rest with both pins high, as with the pull-ups on the real board
+    GPIO.set_input(looper.CLK_PIN, GPIO.HIGH)
+    GPIO.set_input(looper.DT_PIN, GPIO.HIGH)
+
+    # Time from the switch closing to the key being handled by the app
+    pressed_at = {}
+    key_latency = []
+    handle_key = looper.on_key_pressed
+    def timed_key(key):
+        handle_key(key)
+        key_latency.append(time.monotonic() - pressed_at.get(key, time.monotonic()))
+    looper.on_key_pressed = timed_key
+
+    looper.start()
+    device = looper.device
+    fake = device.device
+    writes_before = len(fake.writes)
+
+    rng = random.Random(args.seed)
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=turn_encoder, args=(GPIO, looper.CLK_PIN, looper.DT_PIN, args.detents, stop, rng), daemon=True),
+        threading.Thread(target=press_keys, args=(GPIO, looper.key_map, args.presses, args.hold, pressed_at, stop, rng), daemon=True),
+    ]
+    cpu_start = time.process_time()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    time.sleep(0.2)  # Let the display catch up
+    cpu = time.process_time() - cpu_start
+
+    clock = looper.audio_clock
+    writes = fake.writes[writes_before:]
+    print(file=sys.stderr)
+    print(f"duration            {args.duration:.1f} s, cpu {cpu / args.duration * 100:.1f}%")
+    print(f"encoder             {looper.encoder.steps} detents, {looper.encoder.invalid_transitions} invalid transitions")
+    print(f"keys                {len(key_latency)} handled, latency p50 {percentile(key_latency, 0.5) * 1000:.1f} ms, "
+          f"p99 {percentile(key_latency, 0.99) * 1000:.1f} ms")
+    print(f"display             {looper.display.frames_pushed} frames pushed, {looper.display.frames_dropped} dropped, "
+          f"{sum(size for _, size in writes)} bytes in {len(writes)} writes")
+    print(f"frame cache         {looper.frame_cache.hits} hits, {looper.frame_cache.misses} misses")
+    if clock is not None and clock.buffers:
+        print(f"audio               {clock.buffers} buffers, {clock.late} late, "
+              f"avg {clock.process_time / clock.buffers * 1000:.3f} ms, max {clock.max_process_time * 1000:.3f} ms")
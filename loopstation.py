@@ -0,0 +1,599 @@
+import array
+import os
+import threading
+import time
+from pyo import *
+from allocator import TableAllocator
+from history import HistoryKeeper, TableHistory
+from scheduler import BoundaryGate, LoopScheduler
+from storage import LoopStore
+
+# Audio engine of the looper
+# Nothing in here touches the GPIO or the display, so the same classes run on the Pi
+# against the sound card and headless against pyo's offline server (see render.py)
+
+CHANNEL_MODES = {"mono": 1, "stereo": 2}
+
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "samples")
+
+# Click sounds: sample file, playback speed and gain; the count-in is pitched up to stand out
+CLICK_SOUNDS = {
+    "count_accent": ("click.wav", 1.5, 0.12),
+    "count": ("click2.wav", 1.5, 0.2),
+    "accent": ("click.wav", 1, 0.12),
+    "beat": ("click2.wav", 1, 0.2),
+}
+
+# Input channels the server was booted with; pyo's Server only exposes getNchnls()
+def input_channels(server):
+    return server._server.getIchnls()
+
+# Load a click sample as mono at the server's rate, with its playback speed and gain applied
+def load_click(file, speed, gain, sr):
+    path = os.path.join(SAMPLES_DIR, file)
+    data = SndTable(path, chnl=0).getTable()
+    step = sndinfo(path)[2] * speed / sr
+    length = int((len(data) - 1) / step)
+    click = array.array('f', bytes(4 * length))
+    for i in range(length):
+        pos = i * step
+        j = int(pos)
+        frac = pos - j
+        click[i] = (data[j] + (data[j + 1] - data[j]) * frac) * gain
+    return click
+
+# Metronome class
+# The count-in and one pass of the loop are rendered into a click table whenever the config
+# is applied. A single sample clock reads it, and the loop scheduler starts on the sample
+# that clock reaches the end of the count-in, so beat timing comes from the DSP clock and
+# no Python runs on the beat. The clicks end with the table, when the master loop is done.
+class Metronome:
+    def __init__(self, server, bpm, beats_per_bar, total_bars, time_signature=None):
+        self.set_timing(bpm, beats_per_bar, total_bars, time_signature)
+        self.sr = server.getSamplingRate()
+
+        # click setup
+        self.clicks = {name: load_click(file, speed, gain, self.sr) for name, (file, speed, gain) in CLICK_SOUNDS.items()}
+        self.table = NewTable(length=1, chnls=1)
+        self.count_in_samples = 0
+        self.start_trig = Trig().stop()
+        self.clock = Count(self.start_trig, min=0).stop()  # Samples since the count-in started
+        self.reader = TableIndex(self.table, self.clock).stop()  # Holds the silent last sample once done
+        self.output = Mix(self.reader, voices=server.getNchnls()).stop()
+        # Once per take, not per beat: stop the clock when the table is done
+        self.end = Select(self.clock, value=1)
+        self.done = TrigFunc(self.end, self.finish)
+
+        self.play_clicks = True
+
+    def set_timing(self, bpm, beats_per_bar, total_bars, time_signature=None):
+        self.bpm = bpm
+        self.beats_per_bar = beats_per_bar
+        self.total_bars = total_bars
+        self.time_signature = time_signature if time_signature is not None else f"{beats_per_bar}/4"
+
+        self.interval = 60 / bpm
+        self.duration = self.interval * beats_per_bar * total_bars  # Loop duration in seconds
+
+    def update_params(self, bpm, beats_per_bar, total_bars, time_signature=None):
+        # The click table is rendered again when the config is applied
+        self.set_timing(bpm, beats_per_bar, total_bars, time_signature)
+
+    # Count-in plus one loop of clicks, the loop part exactly as long as the track tables
+    def render(self, loop_samples):
+        interval = self.interval * self.sr
+        self.count_in_samples = round(self.beats_per_bar * interval)
+        size = self.count_in_samples + loop_samples + 1  # Ends on a silent sample
+        self.table.setSize(size)
+        self.table.reset()
+        self.end.setValue(size - 1)
+        beats = self.beats_per_bar * (1 + self.total_bars)
+        starts = [round(beat * interval) for beat in range(beats)] + [size - 1]
+        view = memoryview(self.table.getBuffer(0))
+        for beat in range(beats):
+            downbeat = beat % self.beats_per_bar == 0
+            if beat < self.beats_per_bar:
+                click = self.clicks["count_accent" if downbeat else "count"]
+            else:
+                click = self.clicks["accent" if downbeat else "beat"]
+            length = min(len(click), starts[beat + 1] - starts[beat])  # Cut at the next beat
+            view[starts[beat]:starts[beat] + length] = click[:length]
+        view.release()
+
+    # Beat of the count-in or the loop being clicked, from 1, or 0 before the start
+    def current_beat(self):
+        if not self.clock.isPlaying():
+            return 0
+        return int(self.clock.get() / (self.interval * self.sr)) + 1
+
+    # Seconds until the clock reaches the next beat
+    def time_to_next_beat(self):
+        beat_samples = self.interval * self.sr
+        samples = self.clock.get()
+        return ((int(samples / beat_samples) + 1) * beat_samples - samples) / self.sr
+
+    def finish(self):
+        for obj in (self.clock, self.reader, self.output):
+            obj.stop()
+
+    def reset(self):
+        # Back to the state of a freshly built metronome, ready for a new count-in
+        self.start_trig.stop()
+        self.finish()
+        self.play_clicks = True
+
+    def init(self):
+        self.clock.play()
+        self.reader.play()
+        if self.play_clicks:
+            self.output.out()
+        self.start_trig.play()
+
+# Track class
+class Track:
+    def __init__(self, server, metronome, input_bus, channels=2, feedback=0.5, input_gain=1,
+                 gain=1, pan=0.5, effects=False, on_recorded=None):
+        self.server = server
+        self.metronome = metronome
+        self.input_bus = input_bus  # Shared with every other track
+        self.input_gain = input_gain
+        self.output_gain = gain  # Level and position of the track on the mix bus
+        self.pan = pan
+        self.effects = effects  # Run a private filter/dynamics chain before the mix bus
+        self.channels = channels
+        self.feedback = feedback
+        self.table = None  # Built by prepare()
+        self.playback = None
+        self.recorder = None
+        self.compact = None  # CompactLoop once the recorded table has been converted to int16
+        self.retired = None
+        self.history = None  # Undo/redo of record passes, see history.py
+        self.edits = 0  # Bumped whenever the table contents change after the first pass
+        self.version = 0  # Bumped whenever the loop changes, see session.py
+        self.storage_lock = threading.RLock()  # Held while the table is read, swapped out or recorded into again
+        self.initialized = False  # Flag to ensure initialization only happens once
+        self.recorded = False  # The table holds a complete loop
+        self.overdubbing = False  # A layer is being recorded on top of the loop
+        self.on_recorded = on_recorded  # Called from the audio thread when a recording pass ends
+        self.hp_freq = 400  # Highpass filter frequency
+        self.lp_freq = 4000  # Lowpass filter frequency
+
+    def start_recording(self):
+        # Called once the recorder has been triggered on the audio thread
+        if self.history is not None:
+            self.history.start()
+        print("Recording...")
+
+    def finish_recording(self):
+        self.version += 1
+        self.recorded = True
+        self.overdubbing = False
+        if self.history is not None:
+            self.history.finish()
+        print("Recorded.")
+        if self.on_recorded is not None:
+            self.on_recorded(self)
+
+    def start_playback(self):
+        self.playback.out()
+        print("Playback...")
+
+    def stop_playback(self):
+        self.playback.stop()
+        print("Stopped Playback.")
+        
+    def prepare(self, scheduler, fadetime=0.01, table=None, history_bytes=None):
+        # Build the table and the whole DSP chain ahead of time, stopped until the track is armed
+        if table is None:
+            table = NewTable(length=self.metronome.duration, chnls=self.channels, feedback=self.feedback)
+        self.table = table
+        self.position = scheduler.position
+        self.gain = Sig(self.input_bus, mul=self.input_gain).stop() if self.input_gain != 1 else None
+        self.input = self.gain if self.gain is not None else self.input_bus
+        # Recording and playback both follow the scheduler's sample clock
+        self.gate = BoundaryGate(scheduler.record_trig, self.start_recording)
+        self.recorder = TrigTableRec(self.input, trig=self.gate.trig, table=self.table, fadetime=fadetime)
+        # One stream per channel, and they all end together: listen to the first one only
+        self.trig_done = TrigFunc(self.recorder['trig'][0], self.finish_recording)
+        if history_bytes:
+            self.history = TableHistory(self.table, self.recorder['time'], history_bytes)
+        self.playback = TableIndex(self.table, scheduler.position, mul=20).stop()
+        source = self.playback
+        if self.effects:
+            self.highpass = ButHP(self.playback, freq=self.hp_freq).stop()  # Apply highpass filter
+            self.lowpass = ButLP(self.highpass, freq=self.lp_freq).stop()
+            self.ex = Expand(self.lowpass, downthresh=-90, upthresh=-90, ratio=2).stop()
+            # self.harm = Harmonizer(self.ex, transpo=0, winsize=0.05).out()
+            self.b = Compress(self.ex, thresh=-30, ratio=2, risetime=.01, falltime=.2, knee=0.5).stop()
+            source = self.b
+        # Summed by the LoopStation's MixBus, so the voice is played but never sent out directly
+        self.voice = Pan(source, outs=self.server.getNchnls(), pan=self.pan, mul=self.output_gain).stop()
+
+    # Play the loop from the compact copy's ring table instead of the float table, then free
+    # the float samples; returns False if the table changed since `edits` was read
+    def use_compact(self, loop, fadetime, edits):
+        with self.storage_lock:
+            if self.overdubbing or self.edits != edits:
+                return False
+            # Wrap works in floats, the extra half sample keeps the truncated index from landing one short
+            # (Sig's add, as position + 0.5 would leave a Dummy attached to the scheduler on every swap)
+            self.ring_position = Sig(self.position, add=0.5)
+            self.ring_index = Wrap(self.ring_position, 0, loop.ring_size)
+            ring_playback = TableIndex(loop.ring, self.ring_index, mul=self.playback.mul * loop.scale)
+            (self.highpass if self.effects else self.voice).setInput(ring_playback, fadetime)
+            if self.retired is not None:
+                for obj in self.retired:
+                    obj.stop()
+                self.retired = None
+            self.table_playback = self.playback
+            self.playback = ring_playback
+            time.sleep(fadetime * 2)  # Let the crossfade finish before the table goes away
+            self.table_playback.stop()
+            self.table.setSize(1)
+            self.compact = loop
+            return True
+
+    # Back to the float table, e.g. to record another layer into it
+    def expand(self, fadetime):
+        loop = self.compact
+        self.table.setSize(loop.samples)
+        for chnl, data in enumerate(loop.data):
+            memoryview(self.table.getBuffer(chnl))[:] = array.array('f', data)
+        self.table.mul(loop.scale)
+        self.table_playback.play()
+        (self.highpass if self.effects else self.voice).setInput(self.table_playback, fadetime)
+        self.retired = (self.ring_position, self.ring_index, self.playback)  # Faded out, stopped once the loop is compacted again
+        self.playback = self.table_playback
+        self.compact = None
+
+    # Bytes of sample memory held by this track
+    def memory(self):
+        if self.table is None:
+            return 0
+        size = self.table.getSize() * len(self.table) * 4
+        if self.compact is not None:
+            size += self.compact.nbytes()
+        if self.history is not None:
+            size += self.history.nbytes()
+        return size
+
+    def loop_samples(self):
+        return self.compact.samples if self.compact is not None else self.table.getSize()
+
+    # Raw float32, one channel after the other
+    def write_loop(self, f):
+        with self.storage_lock:
+            if self.compact is not None:
+                self.compact.write_float32(f)
+                return
+            for chnl in range(self.channels):
+                f.write(self.table.getBuffer(chnl))  # Written straight from the table, no copy
+
+    def arm(self, record=True):
+        # Only starts objects that already exist, nothing is allocated on the trigger path
+        if self.gain is not None:
+            self.gain.play()
+        self.playback.play()
+        if self.effects:
+            self.highpass.play()
+            self.lowpass.play()
+            self.ex.play()
+            self.b.play()
+        self.voice.play()
+        if record:
+            if self.history is not None:
+                self.history.begin()
+            self.gate.arm()  # Record from the next loop boundary
+
+    # Record another pass into the same table; what is already there is scaled by the table
+    # feedback and the new pass is added on top, so older layers fade out pass by pass
+    def overdub(self):
+        self.overdubbing = True
+        self.edits += 1  # A compaction that is already running is working from the old layers
+        self.table.setFeedback(self.feedback)
+        if self.history is not None:
+            self.history.begin()
+        self.gate.arm()
+
+    # Step the table back (or forward) one record pass, in place while it plays
+    def undo(self):
+        if self.history is None or not self.history.undo():
+            return False
+        self.edits += 1
+        self.version += 1
+        return True
+
+    def redo(self):
+        if self.history is None or not self.history.redo():
+            return False
+        self.edits += 1
+        self.version += 1
+        return True
+
+    def init_master_track(self):
+        self.metronome.init()
+        self.arm()  # The first boundary is the end of the count-in
+
+    def init_track(self, master):
+        if not self.initialized:
+            self.arm()
+            self.initialized = True
+
+    def stop(self):
+        # Silence the track and detach its callbacks
+        for name in ("gate", "trig_done", "gain", "recorder", "playback", "table_playback", "ring_position", "ring_index",
+                     "highpass", "lowpass", "ex", "b", "voice"):
+            obj = getattr(self, name, None)
+            if obj is not None:
+                obj.stop()
+        for obj in self.retired or ():
+            obj.stop()
+
+# Summing mix bus
+# Every track's voice is summed here and goes through one shared filter and dynamics
+# chain, so the cost of that chain no longer grows with the number of tracks
+class MixBus:
+    def __init__(self, voices, nchnls, hp_freq=400, lp_freq=4000):
+        self.nchnls = nchnls
+        self.mix = Mix(voices, voices=nchnls)
+        self.old_mix = None
+        self.highpass = ButHP(self.mix, freq=hp_freq)  # Apply highpass filter
+        self.lowpass = ButLP(self.highpass, freq=lp_freq)
+        self.ex = Expand(self.lowpass, downthresh=-90, upthresh=-90, ratio=2, mul=0.15)
+        self.b = Compress(self.ex, thresh=-30, ratio=2, risetime=.01, falltime=.2, knee=0.5).out()
+
+    # Crossfade to a new set of voices, e.g. when a slot is prepared late
+    def set_voices(self, voices, fadetime=0.05):
+        self.old_mix = self.mix  # Kept alive until the crossfade is over
+        self.mix = Mix(voices, voices=self.nchnls)
+        self.highpass.setInput(self.mix, fadetime)
+
+    def stop(self):
+        for obj in (self.mix, self.old_mix, self.highpass, self.lowpass, self.ex, self.b):
+            if obj is not None:
+                obj.stop()
+
+# LoopStation class
+class LoopStation:
+    def __init__(self, server, config_option_values, latency, num_slots=6, input_gains=None, input_bus=None,
+                 effects=False, on_track_recorded=None, storage="float32", memory_budget=None,
+                 budget_action="warn", channel_mode="auto", overdub=False, undo_memory=None):
+        self.server = server
+        # Channels per track: "auto" follows the server's inputs, so a mono rig records mono tables
+        if channel_mode == "auto":
+            self.channels = min(input_channels(server), 2)
+        else:
+            self.channels = CHANNEL_MODES[channel_mode]
+        self.config_option_values = config_option_values  # Edited from the config screen until applied
+        self.applied_config = None
+        self.reserved = 0  # Slots that fit the budget, see apply_config()
+        self.latency = latency  # Round-trip latency in seconds
+        self.num_slots = num_slots  # One track slot per keypad key
+        self.input_gains = input_gains if input_gains is not None else [1] * num_slots
+        # Captured once and read by every track's recorder; any PyoObject can stand in for the sound card
+        self.input_bus = input_bus if input_bus is not None else Input(list(range(self.channels)))
+        self.effects = effects  # Give every track its own filter/dynamics chain ahead of the mix bus
+        self.on_track_recorded = on_track_recorded  # E.g. to save the session in the background
+        self.storage = storage  # "int16" keeps finished loops as int16, see storage.py
+        self.memory_budget = memory_budget  # MB of sample memory for all tracks, None for no limit
+        self.budget_action = budget_action  # "warn" or "refuse" when arming a track would go over it
+        self.overdub_enabled = overdub  # Pressing a recorded track's key again records a layer on top of it
+        self.undo_memory = undo_memory  # MB of undo history per track, None for no undo
+        self.history_keeper = None
+        if undo_memory:
+            self.history_keeper = HistoryKeeper()
+            self.history_keeper.start()
+        self.metronome = None
+        self.mix_bus = None
+        self.scheduler = None
+        self.store = None
+        self.slots = []
+        self.tracks = []
+        self.allocator = TableAllocator(channels=self.channels)  # Builds the next config's tables off the UI and audio threads
+        self.allocator.start()
+        self.update_metronome()
+        self.apply_config()
+
+    def update_metronome(self):
+        bpm = self.config_option_values["BPM"]
+        beats_per_bar = int(self.config_option_values["TIME SIGNATURE"].split('/')[0])
+        total_bars = self.config_option_values["TOTAL BARS"]
+        time_signature = self.config_option_values["TIME SIGNATURE"]
+        if self.metronome is None:
+            self.metronome = Metronome(self.server, bpm, beats_per_bar, total_bars, time_signature)
+        else:
+            self.metronome.update_params(bpm, beats_per_bar, total_bars, time_signature)
+        # Built ahead next to the live tracks, so only as many as fit beside them
+        live = sum(track.memory() for track in self.slots)
+        self.allocator.request(self.metronome.duration, self.preallocated_slots(live))
+        self.needs_rebuild = True  # Tracks are rebuilt once, when the config is applied
+
+    # Returns True if the tracks were rebuilt, which throws away what they held
+    def apply_config(self):
+        if not self.needs_rebuild:
+            return False
+        for track in self.slots:
+            track.stop()
+        if self.mix_bus is not None:
+            self.mix_bus.stop()
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        if self.store is not None:
+            self.store.stop()
+        self.metronome.reset()
+
+        # As many track slots as the memory budget allows are reserved for the current config.
+        # They get the tables the allocator has ready; this runs under the UI lock, so only the
+        # master slot may allocate here. The rest are built in the background and picked up by
+        # prepare_slot() when armed, as are slots beyond the reservation if they fit.
+        self.reserved = self.preallocated_slots()
+        tables = []
+        while len(tables) < self.reserved:
+            table = self.allocator.take_ready(self.metronome.duration)
+            if table is None:
+                break
+            tables.append(table)
+        if not tables:
+            tables.append(self.allocator.take(self.metronome.duration))
+        # The loop starts when the count-in ends and lasts exactly one table
+        self.metronome.render(tables[0].getSize())
+        self.scheduler = LoopScheduler(self.server, self.metronome.clock, self.metronome.count_in_samples,
+                                       tables[0].getSize(), self.latency)
+        if self.storage == "int16":
+            self.store = LoopStore(self.scheduler.position, self.server.getSamplingRate())
+            self.store.start()
+        self.slots = [Track(self.server, self.metronome, self.input_bus, channels=self.channels, input_gain=gain,
+                            effects=self.effects, on_recorded=self.track_recorded) for gain in self.input_gains]
+        for i, table in enumerate(tables):
+            self.slots[i].prepare(self.scheduler, fadetime=0.005 if i == 0 else 0.01, table=table,
+                                  history_bytes=self.history_bytes())
+        if self.history_keeper is not None:
+            self.history_keeper.histories = [track.history for track in self.slots if track.history is not None]
+        # Idle slots are stopped and add silence to the mix
+        self.mix_bus = MixBus(self.voices(), self.server.getNchnls())
+
+        self.master_track = self.slots[0]
+        self.tracks = [self.master_track]
+        self.applied_config = dict(self.config_option_values)  # What the tracks were built for
+        self.allocator.request(self.metronome.duration, self.reserved - len(tables))
+        self.needs_rebuild = False
+        print(f"Track tables: {self.allocator.metrics()}")
+        return True
+
+    def voices(self):
+        return [track.voice for track in self.slots if track.table is not None]
+
+    # Bytes of a float table for one loop of the current config
+    def table_bytes(self):
+        return int(self.metronome.duration * self.server.getSamplingRate()) * self.channels * 4
+
+    def history_bytes(self):
+        return int(self.undo_memory * 1e6) if self.undo_memory else None
+
+    # Most a slot can hold: its table plus a full undo history
+    def slot_bytes(self):
+        return self.table_bytes() + (self.history_bytes() or 0)
+
+    # Mono click table for the count-in and one loop, see Metronome.render()
+    def click_bytes(self):
+        seconds = self.metronome.duration + self.metronome.beats_per_bar * self.metronome.interval
+        return int(seconds * self.server.getSamplingRate()) * 4
+
+    # Track tables and histories, plus the click table and tables built ahead for the next config
+    def memory_usage(self):
+        return (sum(track.memory() for track in self.slots) + self.metronome.table.getSize() * 4
+                + self.allocator.nbytes())
+
+    # Slots of the current config that fit the budget, next to `live` bytes still in use
+    # Memory in use, counting the reserved slots not built yet as full slots
+    def committed_memory(self):
+        unbuilt = sum(1 for track in self.slots[:self.reserved] if track.table is None)
+        return self.memory_usage() - self.allocator.nbytes() + unbuilt * self.slot_bytes()
+
+    def preallocated_slots(self, live=0):
+        if self.memory_budget is None:
+            return self.num_slots
+        budget = self.memory_budget * 1e6 - self.click_bytes() - live
+        slots = min(self.num_slots, int(budget // self.slot_bytes()))
+        return max(slots, 0 if live else 1)
+
+    # Build a slot that has no table yet; slots beyond the reservation only if the budget allows it
+    def prepare_slot(self, track_num):
+        track = self.slots[track_num - 1]
+        if track.table is not None:
+            return True
+        if (track_num > self.reserved and self.memory_budget is not None
+                and self.committed_memory() + self.slot_bytes() > self.memory_budget * 1e6):
+            message = (f"Track {track_num} needs up to {self.slot_bytes() / 1e6:.1f} MB, "
+                       f"{self.committed_memory() / 1e6:.1f} of {self.memory_budget} MB in use")
+            if self.budget_action == "refuse":
+                print(f"{message}, not arming it")
+                return False
+            print(f"Warning: {message}")
+        track.prepare(self.scheduler, table=self.allocator.take(self.metronome.duration),
+                      history_bytes=self.history_bytes())
+        if track.history is not None:
+            self.history_keeper.histories.append(track.history)
+        self.mix_bus.set_voices(self.voices())
+        return True
+
+    def track_recorded(self, track):
+        if self.store is not None:
+            self.store.submit(track)
+        if self.on_track_recorded is not None:
+            self.on_track_recorded(track)
+
+    def init_master_track(self):
+        if self.overdub_enabled and self.master_track.recorded:
+            self.overdub(1)
+            return
+        self.master_track.init_master_track()
+        print("Master track initialized")
+        
+    def init_track(self, track_num):
+        track = self.slots[track_num - 1]
+        if track in self.tracks:
+            if self.overdub_enabled and track.recorded:
+                self.overdub(track_num)
+            else:
+                print(f"Track {track_num} already initialized")
+            return
+        if not self.prepare_slot(track_num):
+            return
+        track.init_track(self.master_track)
+        self.tracks.append(track)
+        print(f"Track {track_num} initialized")
+
+    # Layer a new pass onto a recorded track, in the same table
+    def overdub(self, track_num):
+        track = self.slots[track_num - 1]
+        if not track.recorded or track.overdubbing:
+            return
+        with track.storage_lock:
+            if track.compact is not None:
+                self.store.release(track.compact)
+                track.expand(0.01)
+            track.overdub()
+        print(f"Overdubbing track {track_num}")
+
+    def undo(self, track_num):
+        return self.step_history(track_num, "undo")
+
+    def redo(self, track_num):
+        return self.step_history(track_num, "redo")
+
+    def step_history(self, track_num, action):
+        track = self.slots[track_num - 1]
+        history = track.history
+        if history is None:
+            available = False
+        else:
+            available = history.can_undo() if action == "undo" else history.can_redo()
+        if not available or track.overdubbing:
+            print(f"Track {track_num}: nothing to {action}")
+            return False
+        with track.storage_lock:
+            if track.compact is not None:
+                self.store.release(track.compact)
+                track.expand(0.01)
+            done = getattr(track, action)()
+        if done:
+            self.track_recorded(track)  # Compacted again and saved, like a finished pass
+        elif self.store is not None:
+            self.store.submit(track)  # Back to int16 once the table is settled
+        print(f"Track {track_num}: {action} {'done' if done else 'not possible right now'}")
+        return done
+
+    # Play back loops that were copied into the slot tables (see session.py) without a count-in
+    def restore(self, track_nums):
+        for track_num in track_nums:
+            track = self.slots[track_num - 1]
+            track.recorded = True
+            track.initialized = True
+            track.arm(record=False)
+            if track not in self.tracks:
+                self.tracks.append(track)
+            if self.store is not None:
+                self.store.submit(track)
+        self.metronome.play_clicks = False
+        self.scheduler.start_now()
@@ -78,9 +78,11 @@ class Metronome:
             else:
                 self.fclick2.play()
 class Track:
-    def __init__(self, server, metronome, channels=2, feedback=0.5):
+    def __init__(self, server, metronome, input_bus, channels=2, feedback=0.5, input_gain=1):
         self.server = server
         self.metronome = metronome
+        self.input_bus = input_bus  # Shared with every other track
+        self.input_gain = input_gain
         self.channels = channels
         self.feedback = feedback
         self.master_trig = None
@@ -113,7 +115,7 @@ class Track:
     def rec_master_track(self): 
         if self.metronome.countdown_counter.get() == self.metronome.beats_per_bar + 1:
             self.table = NewTable(length=self.metronome.duration, chnls=self.channels, feedback=self.feedback)
-            self.input = Input([0, 1])
+            self.input = Sig(self.input_bus, mul=self.input_gain) if self.input_gain != 1 else self.input_bus
             self.recorder = TableRec(self.input, table=self.table, fadetime=0.005)
             self.playback = Looper(table=self.table, dur=self.metronome.duration, mul=20, xfade=0)
             self.highpass = ButHP(self.playback, freq=self.hp_freq) # Apply highpass filter
@@ -138,7 +140,7 @@ class Track:
     def rec_track(self):
         if not self.initialized:
             self.table = NewTable(length=self.metronome.duration, chnls=self.channels, feedback=self.feedback)
-            self.input = Input([0, 1])
+            self.input = Sig(self.input_bus, mul=self.input_gain) if self.input_gain != 1 else self.input_bus
             self.recorder = TableRec(self.input, table=self.table, fadetime=0.01).out()
             self.playback = Looper(table=self.table, dur=self.metronome.duration, mul=20, xfade=0)
             self.highpass = ButHP(self.playback, freq=self.hp_freq) # Apply highpass filter
@@ -154,9 +156,10 @@ class LoopStation:
     def __init__(self, server, bpm, beats_per_bar, total_bars):
         self.server = server
         self.metronome = Metronome(bpm, beats_per_bar, total_bars)
+        self.input_bus = Input([0, 1])  # Captured once and read by every track's recorder
         self.tracks = []
         
-        self.master_track = Track(server, self.metronome)
+        self.master_track = Track(server, self.metronome, self.input_bus)
         self.tracks.append(self.master_track)
         
     def init_master_track(self):
@@ -164,7 +167,7 @@ class LoopStation:
         print("Master track initialized")
         
     def init_track(self, track_num):
-        track = Track(self.server, self.metronome)
+        track = Track(self.server, self.metronome, self.input_bus)
         track.init_track(self.master_track)
         self.tracks.append(track)
         print(f"Track {track_num} initialized")    
@@ -0,0 +1,53 @@
+import argparse
+import array
+import os
+import random
+import tempfile
+import time
+from pyo import *
+from loopstation import LoopStation
+
+# Compares per-track filter/dynamics chains against the shared mix bus
+# Builds a real LoopStation on pyo's offline server, so no sound card is needed, fills the
+# track tables with noise and plays them back as a restored session would. Reports the CPU
+# time spent per second of audio for an increasing number of playing tracks, with the
+# effects chain on every track (effects=True) and on the mix bus only (the default).
+
+SAMPLE_RATE = 48000
+BUFFER_SIZE = 2048
+RENDER_FILE = os.path.join(tempfile.gettempdir(), "mix_bench.wav")
+CONFIG = {"BPM": 120, "TIME SIGNATURE": "4/4", "TOTAL BARS": 1}  # Two second loops
+
+def fill_with_noise(table, rng):
+    for chnl in range(len(table)):
+        noise = array.array('f', (rng.uniform(-0.3, 0.3) for _ in range(table.getSize())))
+        memoryview(table.getBuffer(chnl))[:] = noise
+
+def measure(effects, num_tracks, nchnls, duration):
+    s = Server(sr=SAMPLE_RATE, buffersize=BUFFER_SIZE, audio='offline', nchnls=nchnls, ichnls=nchnls).boot()
+    loop_station = LoopStation(s, dict(CONFIG), 0, num_slots=num_tracks, input_bus=Noise(0.3), effects=effects)
+    rng = random.Random(1)
+    for track in loop_station.slots:
+        fill_with_noise(track.table, rng)
+    loop_station.restore(range(1, num_tracks + 1))  # Every track plays, nothing records
+
+    s.recordOptions(dur=duration, filename=RENDER_FILE)
+    cpu_start = time.process_time()
+    s.start()  # Blocks until the offline render is done
+    cpu = time.process_time() - cpu_start
+
+    s.shutdown()
+    return cpu / duration * 1000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mix bus CPU benchmark")
+    parser.add_argument("--tracks", type=int, default=6)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--nchnls", type=int, default=2)
+    args = parser.parse_args()
+
+    print("tracks  per-track ms/s  mix-bus ms/s")
+    for num_tracks in range(1, args.tracks + 1):
+        before = measure(True, num_tracks, args.nchnls, args.duration)
+        after = measure(False, num_tracks, args.nchnls, args.duration)
+        print(f"{num_tracks:6} {before:15.2f} {after:13.2f}")
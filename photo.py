@@ -1,20 +1,17 @@
+import os
 import time
-import RPi.GPIO as GPIO
-from PIL import Image
-from luma.core.interface.serial import i2c
-from luma.oled.device import sh1106
+from assets import open_assets
+from hal import GPIO, open_display
+from layout import to_landscape
 
 # Initialize I2C interface and OLED display
-serial = i2c(port=1, address=0x3C)
-device = sh1106(serial)
+device = open_display(port=1, address=0x3C)
 
-# Load the beat images
-beat_images = [
-    Image.open('/home/vice/main/djavu/screens/test1.png').convert('1'),
-    Image.open('/home/vice/main/djavu/screens/test2.png').convert('1'),
-    Image.open('/home/vice/main/djavu/screens/test3.png').convert('1'),
-    Image.open('/home/vice/main/djavu/screens/test4.png').convert('1')
-]
+# Screens come from the asset bundle next to this file, wherever it is installed
+assets = open_assets(os.path.dirname(os.path.abspath(__file__)))
+
+# Load the beat images, rotated once into the display's landscape orientation
+beat_images = [to_landscape(assets.screen(name)) for name in ['test1.png', 'test2.png', 'test3.png', 'test4.png']]
 
 # Define the GPIO pins for the rotary encoder
 CLK_PIN = 17  # GPIO22 connected to the rotary encoder's CLK pin
@@ -33,15 +30,8 @@ button_pressed = False
 current_image_index = 0
 
 def draw_image(image):
-    # Create a new image in portrait mode dimensions
-    temp_image = Image.new('1', (64, 128), "black")
-    temp_image.paste(image, (0, 0))
-    
-    # Rotate the image by 90 degrees to fit the landscape display
-    rotated_image = temp_image.rotate(270, expand=True)
-    
-    # Display the rotated image on the device
-    device.display(rotated_image)
+    # Images are rotated at load time, so they go to the device as they are
+    device.display(image)
 
 def handle_rotary_encoder():
     global prev_CLK_state, button_pressed, current_image_index
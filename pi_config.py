@@ -1,25 +1,21 @@
+import os
 import time
 import threading
-import RPi.GPIO as GPIO
-from gpiozero import Button
-from PIL import Image, ImageDraw, ImageFont
-from luma.core.interface.serial import i2c
-from luma.oled.device import sh1106
+from hal import GPIO, Button, open_display
+from display import DeltaDevice, DisplayController
+from render_cache import load_font
+from layout import LandscapeCanvas
+from keypad import KeypadScanner
+from rotary import DIRECTION_CW, QuadratureDecoder
 
 def setup_rotary_encoder():
-    global CLK_PIN, DT_PIN, SW_PIN, DIRECTION_CW, DIRECTION_CCW, prev_CLK_state, lock, direction, counter, button_pressed, prev_button_state
+    global CLK_PIN, DT_PIN, SW_PIN, lock, button_pressed, prev_button_state
 
     # Define the GPIO pins for the rotary encoder
     CLK_PIN = 17  # GPIO7 connected to the rotary encoder's CLK pin
     DT_PIN = 27   # GPIO8 connected to the rotary encoder's DT pin
     SW_PIN = 22   # GPIO25 connected to the rotary encoder's SW pin
 
-    DIRECTION_CW = 0
-    DIRECTION_CCW = 1
-
-    counter = 0
-    direction = DIRECTION_CW
-    prev_CLK_state = GPIO.HIGH
     button_pressed = False
     prev_button_state = GPIO.HIGH
 
@@ -39,11 +35,8 @@ def setup_rotary_encoder():
     GPIO.setup(DT_PIN, GPIO.IN)
     GPIO.setup(SW_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
 
-    # Read the initial state of the rotary encoder's CLK pin
-    prev_CLK_state = GPIO.input(CLK_PIN)
-
 def setup_matrix_keypad():
-    global row_pins, col_pins, rows, key_map, debounce_time
+    global row_pins, col_pins, rows, key_map, keypad
     debounce_time = 0.05  # 50 ms debounce time
 
     # Define the GPIO pins for rows and columns of the matrix keypad
@@ -64,41 +57,34 @@ def setup_matrix_keypad():
         (12, 13): 4, (12, 6): 5, (12, 5): 6
     }
 
-    # Attach the callback function to the button press event for each row
-    for row in rows:
-        row.when_pressed = lambda row=row: matrix_button_pressed(row)
+    # Scan the matrix on its own thread; the row callbacks only wake it up
+    keypad = KeypadScanner(GPIO, rows, col_pins, key_map, debounce_time=debounce_time)
 
-def matrix_button_pressed(row_pin):
+def on_key_pressed(key):
     global current_config_option
-
-    # Disable all column outputs
-    for col in col_pins:
-        GPIO.output(col, GPIO.LOW)
-
-    # Detect which button was pressed
-    for col in col_pins:
-        GPIO.output(col, GPIO.HIGH)
-        time.sleep(debounce_time)  # Debounce delay
-        if row_pin.is_pressed:
-            key = key_map.get((row_pin.pin.number, col), None)
-            if key:
-                print(f"Matrix Keypad:: Key pressed: {key}")
-                if key == 1:  # Advance configuration option when key 1 is pressed
-                    with lock:
-                        current_config_option = (current_config_option + 1) % len(config_options)
-                        print(f"Switched to: {config_options[current_config_option]}")
-        GPIO.output(col, GPIO.LOW)
-
-    # Re-enable all column outputs
-    for col in col_pins:
-        GPIO.output(col, GPIO.HIGH)
+    print(f"Matrix Keypad:: Key pressed: {key}")
+    if key == 1:  # Advance configuration option when key 1 is pressed
+        with lock:
+            current_config_option = (current_config_option + 1) % len(config_options)
+            print(f"Switched to: {config_options[current_config_option]}")
+            publish_screen()
+
+# Matrix keypad event handling
+def handle_keypad_events():
+    while True:
+        key, pressed, timestamp = keypad.events.get()
+        if pressed:
+            on_key_pressed(key)
 
 # Initialize I2C interface and OLED display
-serial = i2c(port=1, address=0x3C)
-device = sh1106(serial)
+device = DeltaDevice(open_display(port=1, address=0x3C))  # Only send the pages that changed
+
+# Fonts live next to this file
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # Path to your TTF font file
-font_path = 'fonts/InputSansNarrow-Thin.ttf'
+font_path = os.path.join(BASE_DIR, 'fonts', 'InputSansNarrow-Thin.ttf')
+font = load_font(font_path, 12)  # Loaded once, used by every frame
 
 # CONFIG options
 config_options = ["BPM", "TIME SIGNATURE", "TOTAL BARS"]
@@ -114,105 +100,85 @@ current_config_option = 0
 setup_rotary_encoder()
 setup_matrix_keypad()
 
-def draw_config_screen():
+def draw_config_screen(config_option, bpm, time_signature, total_bars):
+    # Lay out in portrait coordinates, drawn straight into the landscape framebuffer
+    canvas = LandscapeCanvas()
+
+    # Draw config option
+    option = config_options[config_option]
+    if option == "BPM":
+        value = f"{bpm} BPM"
+    elif option == "TIME SIGNATURE":
+        value = time_signature
+    elif option == "TOTAL BARS":
+        value = f"{total_bars} BARS"
+
+    # Calculate text position
+    bbox = canvas.textbbox(value, font)  # Get bounding box
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+    text_x = (64 - text_width) // 2
+    text_y = (128 - text_height) // 2  # Slightly below center, moved 5 pixels up
+
+    # Draw text on the screen
+    canvas.text((text_x, text_y), value, font, fill="white")
+
+    return canvas.image
+
+def screen_state():
+    return (current_config_option, config_option_values["BPM"],
+            config_option_values["TIME SIGNATURE"], config_option_values["TOTAL BARS"])
+
+# Redraw only when the encoder or the keypad publish a change
+display = DisplayController(device, lambda state: draw_config_screen(*state), lock)
+
+# Push a new screen state to the display thread
+def publish_screen():
+    display.publish(screen_state())
+
+def on_rotary_step(direction, timestamp):
     global current_config_option
     with lock:
-        # Create an image in portrait mode dimensions
-        image = Image.new('1', (64, 128), "black")
-        draw = ImageDraw.Draw(image)
-        
-        # Load a custom font
-        font_size = 12  # Adjust the font size as needed
-        font = ImageFont.truetype(font_path, font_size)
-
-        # Draw config option
         option = config_options[current_config_option]
         if option == "BPM":
-            value = f"{config_option_values[option]} BPM"
+            if direction == DIRECTION_CW:
+                config_option_values[option] += 1
+                if config_option_values[option] > 200:
+                    config_option_values[option] = 200
+            else:
+                config_option_values[option] -= 1
+                if config_option_values[option] < 40:
+                    config_option_values[option] = 40
         elif option == "TIME SIGNATURE":
-            value = config_option_values[option]
+            index = time_signature_options.index(config_option_values[option])
+            if direction == DIRECTION_CW:
+                index = (index + 1) % len(time_signature_options)
+            else:
+                index = (index - 1) % len(time_signature_options)
+            config_option_values[option] = time_signature_options[index]
         elif option == "TOTAL BARS":
-            value = f"{config_option_values[option]} BARS"
-
-        # Calculate text position
-        bbox = draw.textbbox((0, 0), value, font=font)  # Get bounding box
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        text_x = (64 - text_width) // 2
-        text_y = (128 - text_height) // 2  # Slightly below center, moved 5 pixels up
-
-        # Draw text on the screen
-        draw.text((text_x, text_y), value, font=font, fill="white")
-        
-        # Rotate the image by 90 degrees to fit the landscape display
-        rotated_image = image.rotate(270, expand=True)
-        
-        # Display the rotated image on the device
-        device.display(rotated_image)
-
-def handle_rotary_encoder():
-    global counter, direction, prev_CLK_state, current_config_option
-    while True:
-        # Read the current state of the rotary encoder's CLK and DT pins
-        CLK_state = GPIO.input(CLK_PIN)
-        DT_state = GPIO.input(DT_PIN)
-
-        # If the state of CLK is changed, then pulse occurred
-        if CLK_state != prev_CLK_state:
-            # Determine the direction
-            if DT_state != CLK_state:
-                direction = DIRECTION_CW
+            if direction == DIRECTION_CW:
+                config_option_values[option] += 1
+                if config_option_values[option] > 16:
+                    config_option_values[option] = 16
             else:
-                direction = DIRECTION_CCW
-
-            counter += 1
-            if counter % 2 == 0:  # Only update on every second step
-                with lock:
-                    option = config_options[current_config_option]
-                    if option == "BPM":
-                        if direction == DIRECTION_CW:
-                            config_option_values[option] += 1
-                            if config_option_values[option] > 200:
-                                config_option_values[option] = 200
-                        else:
-                            config_option_values[option] -= 1
-                            if config_option_values[option] < 40:
-                                config_option_values[option] = 40
-                    elif option == "TIME SIGNATURE":
-                        index = time_signature_options.index(config_option_values[option])
-                        if direction == DIRECTION_CW:
-                            index = (index + 1) % len(time_signature_options)
-                        else:
-                            index = (index - 1) % len(time_signature_options)
-                        config_option_values[option] = time_signature_options[index]
-                    elif option == "TOTAL BARS":
-                        if direction == DIRECTION_CW:
-                            config_option_values[option] += 1
-                            if config_option_values[option] > 16:
-                                config_option_values[option] = 16
-                        else:
-                            config_option_values[option] -= 1
-                            if config_option_values[option] < 1:
-                                config_option_values[option] = 1
-
-                    print(f"{option}: {config_option_values[option]}")
-
-        # Save last CLK state
-        prev_CLK_state = CLK_state
-
-        time.sleep(0.001)  # Small delay to prevent CPU overuse
-
-def update_screen():
-    while True:
-        draw_config_screen()
-        time.sleep(0.1)  # Update the screen every 0.1 seconds
+                config_option_values[option] -= 1
+                if config_option_values[option] < 1:
+                    config_option_values[option] = 1
+
+        print(f"{option}: {config_option_values[option]}")
+        publish_screen()  # Redraw only when something changed
 
 try:
     print(f"Listening for rotary encoder changes and button presses...")
 
-    # Start threads for handling the rotary encoder, button press, and screen update
-    threading.Thread(target=handle_rotary_encoder, daemon=True).start()
-    threading.Thread(target=update_screen, daemon=True).start()
+    # Decode the rotary encoder from pin edge interrupts, then start the keypad and display threads
+    encoder = QuadratureDecoder(GPIO, CLK_PIN, DT_PIN, on_rotary_step)
+    encoder.start()
+    keypad.start()
+    threading.Thread(target=handle_keypad_events, daemon=True).start()
+    display.start()
+    publish_screen()
 
     # Keep the main thread running
     while True:
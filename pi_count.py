@@ -1,33 +1,40 @@
+import os
 import time
-import RPi.GPIO as GPIO
-from PIL import Image, ImageDraw, ImageFont
-from luma.core.interface.serial import i2c
-from luma.oled.device import sh1106
+from assets import ScreenSet, open_assets
+from countdown import CountdownAtlas
+from display import DeltaDevice
+from hal import GPIO, open_display
+from layout import use_prerendered
+from render_cache import load_font
 
 # Initialize I2C interface and OLED display
-serial = i2c(port=1, address=0x3C)
-device = sh1106(serial)
+device = DeltaDevice(open_display(port=1, address=0x3C))  # Only send the pages that changed
+
+# Fonts and screens live next to this file
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # Path to your TTF font file
-font_path = 'fonts/InputSansNarrow-Thin.ttf'
+font_path = os.path.join(BASE_DIR, 'fonts', 'InputSansNarrow-Thin.ttf')
 
 # Configuration variables
 total_beats = 4  # Change this value for different total beats
 beat_interval = 0.5  # Time in seconds between beats, can be changed later
 time_signature = "4/4"  # Change this to "2/4", "3/4", or "6/8" as needed
 
-# Dictionary to store image paths for each time signature
+# Dictionary to store image files (in screens/) for each time signature
 beat_images = {
-    "2/4": ['screens/2-4_1.png', 'screens/2-4_2.png'],
-    "3/4": ['screens/3-4_1.png', 'screens/3-4_2.png', 'screens/3-4_3.png'],
-    "4/4": ['screens/4-4_1.png', 'screens/4-4_2.png', 'screens/4-4_3.png', 'screens/4-4_4.png'],
-    "6/8": ['screens/6-8_1.png', 'screens/6-8_2.png', 'screens/6-8_3.png', 'screens/6-8_4.png', 'screens/6-8_5.png', 'screens/6-8_6.png']
+    "2/4": ['2-4_1.png', '2-4_2.png'],
+    "3/4": ['3-4_1.png', '3-4_2.png', '3-4_3.png'],
+    "4/4": ['4-4_1.png', '4-4_2.png', '4-4_3.png', '4-4_4.png'],
+    "6/8": ['6-8_1.png', '6-8_2.png', '6-8_3.png', '6-8_4.png', '6-8_5.png', '6-8_6.png']
 }
 
-# Load the beat images
-beat_images_loaded = {}
-for key, paths in beat_images.items():
-    beat_images_loaded[key] = [Image.open(path).convert('1') for path in paths]
+# Beat images from the asset bundle, then every countdown frame of the current time signature
+assets = open_assets(BASE_DIR)
+use_prerendered(assets.text)
+beat_images_loaded = ScreenSet(assets, beat_images)
+atlas = CountdownAtlas(device, beat_images_loaded, load_font(font_path, 30))
+atlas.build(time_signature)
 
 # Define the GPIO pins for the rotary encoder
 CLK_PIN = 17  # GPIO22 connected to the rotary encoder's CLK pin
@@ -44,43 +51,15 @@ GPIO.setup(SW_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
 prev_CLK_state = GPIO.input(CLK_PIN)
 button_pressed = False
 
-def draw_countdown_image(image, text):
-    # Create a new image for drawing text in portrait mode dimensions
-    temp_image = Image.new('1', (64, 128), "black")
-    draw = ImageDraw.Draw(temp_image)
-    
-    # Paste the beat image onto the temporary image
-    temp_image.paste(image, (0, 0))
-    
-    # Load a custom font
-    font_size = 30  # Adjust the font size as needed
-    font = ImageFont.truetype(font_path, font_size)
-    
-    # Calculate text position
-    bbox = draw.textbbox((0, 0), text, font=font)
-    text_width = bbox[2] - bbox[0]
-    text_height = bbox[3] - bbox[1]
-    text_x = (64 - text_width) // 2
-    text_y = (128 - text_height) // 2
-    
-    # Draw text on the image
-    draw.text((text_x, text_y), text, font=font, fill="white")  # White text
-    
-    # Rotate the image by 90 degrees to fit the landscape display
-    rotated_image = temp_image.rotate(270, expand=True)
-    
-    # Display the rotated image on the device
-    device.display(rotated_image)
-
 def countdown(total_beats, beat_interval, beat_images):
+    total_beats = min(total_beats, len(beat_images[time_signature]))  # One screen per beat in the bar
     beat_count = total_beats
-    images = beat_images_loaded[time_signature]
     
     try:
         while beat_count > 0:
-            # Display the current beat image with the countdown number overlay
+            # Display the current beat image with the countdown number overlay, prebuilt in the atlas
             image_index = total_beats - beat_count
-            draw_countdown_image(images[image_index], str(beat_count))
+            device.display_pages(atlas.frame(time_signature, image_index + 1, beat_count))
             time.sleep(beat_interval)
             beat_count -= 1
     
@@ -1,3 +1,4 @@
+import os
 from luma.core.interface.serial import i2c
 from luma.oled.device import sh1106
 from luma.core.render import canvas
@@ -9,8 +10,11 @@ import time
 serial = i2c(port=1, address=0x3C)
 device = sh1106(serial)
 
+# Fonts live next to this file
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 # Path to your TTF font file
-font_path = 'fonts/InputSansNarrow-Thin.ttf'
+font_path = os.path.join(BASE_DIR, 'fonts', 'InputSansNarrow-Thin.ttf')
 
 # Menu options
 menu_options = ["GRABAR", "CONFIG"]
@@ -0,0 +1,77 @@
+import argparse
+import functools
+import json
+import time
+from pyo import *
+from loopstation import LoopStation
+
+# Headless, faster-than-realtime session render
+# Boots pyo's offline server, feeds a WAV file in place of the sound card input, replays
+# a script of key presses at fixed times and writes the whole session to disk. The same
+# script and input always give the same render.
+#
+# Key events are (seconds, key) pairs: key 1 starts the master track, keys 2-6 arm tracks.
+#   python render.py loop_input.wav --key 0:1 --key 5:2 --duration 20 --out session.wav
+
+def parse_key(value):
+    at, key = value.split(':')
+    return float(at), int(key)
+
+def load_events(path):
+    with open(path) as f:
+        return [(float(at), int(key)) for at, key in json.load(f)]
+
+def press(loop_station, key):
+    if key == 1:
+        loop_station.init_master_track()
+    else:
+        loop_station.init_track(key)
+
+def render(input_path, events, out_path, duration, bpm=120, time_signature="4/4", total_bars=2,
+           latency=0.0, sr=48000, buffersize=2048, nchnls=2):
+    s = Server(sr=sr, buffersize=buffersize, audio='offline', nchnls=nchnls).boot()
+
+    # The tracks record as many channels as the server has inputs, mix the file to that
+    player = SfPlayer(input_path)
+    input_bus = player if sndinfo(input_path)[3] == nchnls else Mix(player, voices=nchnls)
+
+    config_option_values = {
+        "BPM": bpm,
+        "TIME SIGNATURE": time_signature,
+        "TOTAL BARS": total_bars
+    }
+    loop_station = LoopStation(s, config_option_values, latency, input_bus=input_bus)
+
+    # CallAfter runs on the audio clock, so events land on the same buffer every render
+    # The list keeps the CallAfter objects alive until the render is done, pyo drops them otherwise
+    calls = [CallAfter(functools.partial(press, loop_station, key), time=at) for at, key in sorted(events)]
+
+    s.recordOptions(dur=duration, filename=out_path)
+    start = time.perf_counter()
+    s.start()  # Blocks until the render is done
+    elapsed = time.perf_counter() - start
+    s.shutdown()
+
+    print(f"Rendered {duration} s to {out_path} in {elapsed:.2f} s ({duration / elapsed:.1f}x realtime, "
+          f"{len(calls)} key events)")
+    return elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline LoopStation render")
+    parser.add_argument("input", help="WAV file used as the audio input")
+    parser.add_argument("--key", type=parse_key, action="append", default=[], metavar="SECONDS:KEY")
+    parser.add_argument("--events", help="JSON list of [seconds, key] pairs")
+    parser.add_argument("--out", default="render.wav")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--bpm", type=int, default=120)
+    parser.add_argument("--time-signature", default="4/4")
+    parser.add_argument("--bars", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.0, help="Round-trip latency to compensate, in seconds")
+    parser.add_argument("--sr", type=int, default=48000)
+    parser.add_argument("--buffersize", type=int, default=2048)
+    parser.add_argument("--channels", type=int, choices=[1, 2], default=2, help="Server input/output channels")
+    args = parser.parse_args()
+
+    events = args.key + (load_events(args.events) if args.events else [])
+    render(args.input, events, args.out, args.duration, args.bpm, args.time_signature, args.bars,
+           args.latency, args.sr, args.buffersize, args.channels)
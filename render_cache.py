@@ -0,0 +1,36 @@
+from collections import OrderedDict
+from functools import lru_cache
+from PIL import ImageFont
+
+# Load each (font, size) pair from disk only once
+@lru_cache(maxsize=None)
+def load_font(font_path, font_size):
+    return ImageFont.truetype(font_path, font_size)
+
+# Memoized screen renderer
+# The render function receives the state tuple as arguments and returns a finished
+# landscape frame; repeated states are served from the cache with LRU eviction
+class FrameCache:
+    def __init__(self, render, maxsize=64):
+        self.render = render
+        self.maxsize = maxsize
+        self.frames = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, state):
+        frame = self.frames.get(state)
+        if frame is not None:
+            self.frames.move_to_end(state)  # Mark as most recently used
+            self.hits += 1
+            return frame
+
+        self.misses += 1
+        frame = self.render(*state)
+        self.frames[state] = frame
+        if len(self.frames) > self.maxsize:
+            self.frames.popitem(last=False)  # Evict the least recently used frame
+        return frame
+
+    def clear(self):
+        self.frames.clear()
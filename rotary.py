@@ -0,0 +1,67 @@
+import threading
+import time
+
+DIRECTION_CW = 0
+DIRECTION_CCW = 1
+
+# Quadrature transition table, indexed by (previous_state << 2) | new_state with state = (CLK << 1) | DT
+# +1 is a clockwise transition, -1 counter-clockwise, 0 no movement and None an impossible
+# jump where both pins changed at once (an edge was missed)
+TRANSITIONS = (
+    0, -1, 1, None,
+    1, 0, None, -1,
+    -1, None, 0, 1,
+    None, 1, -1, 0,
+)
+
+# Edge-triggered rotary encoder decoder
+# Both pins raise an interrupt on every edge; the decoder walks the full quadrature state
+# table and calls on_step(direction, timestamp) once per detent
+class QuadratureDecoder:
+    def __init__(self, gpio, clk_pin, dt_pin, on_step, transitions_per_detent=4):
+        self.gpio = gpio  # RPi.GPIO or any backend with the same interface
+        self.clk_pin = clk_pin
+        self.dt_pin = dt_pin
+        self.on_step = on_step
+        self.transitions_per_detent = transitions_per_detent  # One full quadrature cycle per detent
+
+        self.lock = threading.Lock()
+        self.state = self.read_state()
+        self.position = 0  # Transitions accumulated towards the next detent
+
+        # Statistics
+        self.steps = 0
+        self.invalid_transitions = 0
+        self.last_step_time = None
+
+    def read_state(self):
+        return (self.gpio.input(self.clk_pin) << 1) | self.gpio.input(self.dt_pin)
+
+    def start(self):
+        for pin in (self.clk_pin, self.dt_pin):
+            self.gpio.add_event_detect(pin, self.gpio.BOTH, callback=self.handle_edge)
+
+    def stop(self):
+        for pin in (self.clk_pin, self.dt_pin):
+            self.gpio.remove_event_detect(pin)
+
+    def handle_edge(self, channel):
+        timestamp = time.monotonic()
+        state = self.read_state()
+        with self.lock:
+            delta = TRANSITIONS[(self.state << 2) | state]
+            self.state = state
+            if delta is None:
+                self.invalid_transitions += 1
+                return
+            if delta == 0:
+                return  # Bounce on a pin that settled back to the same state
+
+            self.position += delta
+            if abs(self.position) < self.transitions_per_detent:
+                return
+            self.position = 0
+            self.steps += 1
+            self.last_step_time = timestamp
+
+        self.on_step(DIRECTION_CW if delta > 0 else DIRECTION_CCW, timestamp)
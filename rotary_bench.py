@@ -0,0 +1,86 @@
+import argparse
+import threading
+import time
+from rotary import QuadratureDecoder
+from sim_gpio import SimulatedGPIO
+
+# Compares the old 1 ms polling loop against the edge-triggered decoder on a simulated
+# encoder, reporting missed detents and CPU time for several knob speeds
+
+CLK_PIN = 17
+DT_PIN = 27
+
+# Clockwise quadrature sequence of (CLK, DT) starting from the resting state
+CW_SEQUENCE = [(0, 1), (0, 0), (1, 0), (1, 1)]
+
+def turn_knob(gpio, detents, detents_per_second):
+    # Drive the pins on an absolute schedule so sleep overshoot does not slow the knob down
+    interval = 1 / (detents_per_second * len(CW_SEQUENCE))
+    start = time.perf_counter()
+    transition = 0
+    for _ in range(detents):
+        for clk, dt in CW_SEQUENCE:
+            transition += 1
+            delay = start + transition * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            gpio.set_input(CLK_PIN, clk)
+            gpio.set_input(DT_PIN, dt)
+
+def run_polling(gpio, detents, detents_per_second):
+    # Same logic as the old handle_rotary_encoder() loop
+    steps = 0
+    counter = 0
+    prev_clk = gpio.input(CLK_PIN)
+    done = threading.Event()
+
+    def poll():
+        nonlocal steps, counter, prev_clk
+        while not done.is_set():
+            clk = gpio.input(CLK_PIN)
+            if clk != prev_clk:
+                counter += 1
+                if counter % 2 == 0:
+                    steps += 1
+            prev_clk = clk
+            time.sleep(0.001)
+
+    thread = threading.Thread(target=poll, daemon=True)
+    thread.start()
+    turn_knob(gpio, detents, detents_per_second)
+    time.sleep(0.01)
+    done.set()
+    thread.join()
+    return steps
+
+def run_decoder(gpio, detents, detents_per_second):
+    decoder = QuadratureDecoder(gpio, CLK_PIN, DT_PIN, lambda direction, timestamp: None)
+    decoder.start()
+    turn_knob(gpio, detents, detents_per_second)
+    decoder.stop()
+    return decoder.steps
+
+def measure(method, detents, detents_per_second):
+    gpio = SimulatedGPIO()
+    gpio.setup(CLK_PIN, gpio.IN, pull_up_down=gpio.PUD_UP)
+    gpio.setup(DT_PIN, gpio.IN, pull_up_down=gpio.PUD_UP)
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    steps = method(gpio, detents, detents_per_second)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    return steps, cpu / wall * 100
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rotary encoder decoding benchmark")
+    parser.add_argument("--detents", type=int, default=100)
+    parser.add_argument("--speeds", type=int, nargs="+", default=[5, 20, 50, 100, 200])
+    args = parser.parse_args()
+
+    print("method   detents/s  detected  missed%  cpu%")
+    for speed in args.speeds:
+        for name, method in (("polling", run_polling), ("decoder", run_decoder)):
+            steps, cpu = measure(method, args.detents, speed)
+            missed = max(args.detents - steps, 0) / args.detents * 100
+            print(f"{name:8} {speed:9} {steps:9} {missed:7.1f} {cpu:5.1f}")
@@ -0,0 +1,53 @@
+from pyo import Count, SDelay, Select, Sig, Trig, TrigFunc, TrigVal
+
+# Sample-accurate loop clock
+# Everything here runs on the audio thread as pyo signals: the loop starts on the exact
+# sample the metronome's clock reaches start_value, the position counts samples from there
+# and wraps every loop_samples, and record triggers are the loop boundaries delayed by the
+# round-trip latency, so recordings line up with playback to the sample
+class LoopScheduler:
+    def __init__(self, server, clock, start_value, loop_samples, latency):
+        self.sr = server.getSamplingRate()
+        self.loop_samples = loop_samples
+        self.latency_samples = int(round(latency * self.sr))
+
+        self.manual_start = Trig().stop()  # Starts the loop without a count-in, see start_now()
+        self.start = Select(clock, value=start_value) + self.manual_start
+        self.position = Count(self.start, min=0, max=loop_samples - 1)  # Sample index within the loop
+        self.running = TrigVal(self.start, value=1, init=0)
+        # Select also matches the idle position before the start, so only count wraps once running
+        self.wrap = Select(self.position, value=0) * self.running
+        self.boundary = self.start + self.wrap  # First loop start, then every wrap
+
+        # Half a sample of margin so the float delay never truncates to one sample early
+        delay = (self.latency_samples + 0.5) / self.sr
+        self.record_trig = SDelay(self.boundary, delay=delay, maxdelay=delay + 1)
+
+    def start_now(self):
+        self.manual_start.play()
+
+    def stop(self):
+        for obj in (self.manual_start, self.start, self.position, self.running, self.wrap, self.boundary, self.record_trig):
+            obj.stop()
+
+# Lets a single record trigger through
+# Once armed, the next trigger passes and the gate closes itself again from a TrigFunc,
+# which has a whole loop to run before the following boundary could get through
+class BoundaryGate:
+    def __init__(self, trig, callback=None):
+        self.callback = callback
+        self.armed = Sig(0)
+        self.trig = trig * self.armed
+        self.close = TrigFunc(self.trig, self.fired)
+
+    def arm(self):
+        self.armed.value = 1
+
+    def fired(self):
+        self.armed.value = 0
+        if self.callback is not None:
+            self.callback()
+
+    def stop(self):
+        self.armed.value = 0
+        self.close.stop()
@@ -1,3 +1,4 @@
+import os
 from luma.core.interface.serial import i2c
 from luma.core.render import canvas
 from luma.oled.device import sh1106
@@ -10,8 +11,11 @@ serial = i2c(port=1, address=0x3C)
 # Initialize the sh1106 device in landscape mode
 device = sh1106(serial)
 
+# Fonts live next to this file
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 # Path to your TTF font file
-font_path = 'fonts/InputSansNarrow-Thin.ttf'
+font_path = os.path.join(BASE_DIR, 'fonts', 'InputSansNarrow-Thin.ttf')
 
 # Create an image in portrait mode dimensions
 image = Image.new('1', (64, 128), "black")
@@ -0,0 +1,155 @@
+import json
+import mmap
+import os
+import threading
+import time
+import weakref
+
+# Session store
+# Saves every recorded track table plus the config to a directory. save() only hands the
+# loop station to a writer thread, so it is safe to call from the audio thread (e.g. when
+# a recording pass ends); requests made while a save is running are merged into one.
+# Each track is raw float32, one channel after the other, written to a temporary file and
+# renamed into place; session.json is replaced last, so a crash never leaves a session
+# that points at half-written audio. load() memory-maps the files and copies them straight
+# into the table buffers; with int16 storage the loop station compacts them again.
+# A track file is only rewritten when the track's version says its loop has changed.
+
+SESSION_FILE = "session.json"
+
+class SessionStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self.condition = threading.Condition()
+        self.pending = None
+        self.written = {}  # Track number -> (weakref to the track, version) last on disk
+
+        # Statistics
+        self.saves = 0
+        self.tracks_written = 0
+        self.last_save_time = 0.0
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def save(self, loop_station):
+        with self.condition:
+            self.pending = loop_station
+            self.condition.notify()
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.directory, SESSION_FILE))
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None:
+                    self.condition.wait()
+                loop_station = self.pending
+                self.pending = None
+            try:
+                self.write(loop_station)
+            except OSError as e:
+                print(f"Session save failed: {e}")
+
+    def write(self, loop_station):
+        start = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+
+        tracks = []
+        for track_num, track in enumerate(loop_station.slots, start=1):
+            if not track.recorded:
+                continue
+            name = f"track{track_num}.f32"
+            path = os.path.join(self.directory, name)
+            version = track.version  # Read first, a pass finishing during the write is saved next time
+            if not self.is_written(track_num, track, version) or not os.path.exists(path):
+                with open(path + ".tmp", "wb") as f:
+                    track.write_loop(f)  # int16 loops are written back out as float32
+                os.replace(path + ".tmp", path)
+                self.written[track_num] = (weakref.ref(track), version)
+                self.tracks_written += 1
+            tracks.append({"track": track_num, "file": name, "channels": track.channels,
+                           "samples": track.loop_samples()})
+
+        session = {
+            "sr": loop_station.server.getSamplingRate(),
+            "config": loop_station.applied_config,  # Not the values still being edited
+            "tracks": tracks,
+        }
+        path = os.path.join(self.directory, SESSION_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(session, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+        # Loops of tracks that are no longer recorded, e.g. after a config change
+        names = {entry["file"] for entry in tracks}
+        for name in os.listdir(self.directory):
+            if name.startswith("track") and name.endswith(".f32") and name not in names:
+                os.remove(os.path.join(self.directory, name))
+
+        self.saves += 1
+        self.last_save_time = time.perf_counter() - start
+
+    def is_written(self, track_num, track, version):
+        written = self.written.get(track_num)
+        return written is not None and written[0]() is track and written[1] == version
+
+    # Rebuild the loop station for the saved config and start its loops playing
+    # A session that cannot be read is skipped, and so is any track whose file is missing or
+    # does not match, so a bad save never keeps the looper from booting
+    def load(self, loop_station):
+        try:
+            with open(os.path.join(self.directory, SESSION_FILE)) as f:
+                session = json.load(f)
+            sr = session["sr"]
+            config = {name: session["config"][name] for name in loop_station.config_option_values}
+            entries = list(session["tracks"])
+            if not (isinstance(config["BPM"], int) and isinstance(config["TOTAL BARS"], int)):
+                raise ValueError(f"Bad config {config}")
+            int(config["TIME SIGNATURE"].split('/')[0])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Could not read the saved session, starting empty: {e!r}")
+            return []
+        if sr != loop_station.server.getSamplingRate():
+            print(f"Session was recorded at {sr} Hz, not loading it")
+            return []
+
+        loop_station.config_option_values.update(config)
+        loop_station.update_metronome()
+        loop_station.apply_config()
+
+        loaded = []
+        for entry in entries:
+            try:
+                if self.load_track(loop_station, entry):
+                    loaded.append(entry["track"])
+            except (OSError, ValueError, KeyError, TypeError, IndexError) as e:
+                print(f"Could not load saved track {entry!r}, skipping it: {e!r}")
+
+        if loaded:
+            loop_station.restore(loaded)
+        print(f"Session loaded: tracks {loaded}")
+        return loaded
+
+    def load_track(self, loop_station, entry):
+        if not loop_station.prepare_slot(entry["track"]):
+            return False  # Over the memory budget
+        table = loop_station.slots[entry["track"] - 1].table
+        samples = entry["samples"]
+        if samples != table.getSize() or entry["channels"] > len(table):
+            print(f"Track {entry['track']} does not match the session config, skipping it")
+            return False
+        with open(os.path.join(self.directory, entry["file"]), "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if len(mapped) != samples * entry["channels"] * 4:
+                    raise ValueError(f"{entry['file']} is {len(mapped)} bytes, expected {samples * entry['channels'] * 4}")
+                view = memoryview(mapped)
+                data = view.cast('f')
+                for chnl in range(entry["channels"]):
+                    memoryview(table.getBuffer(chnl))[:] = data[chnl * samples:(chnl + 1) * samples]
+                data.release()  # The map can only be closed once nothing points into it
+                view.release()
+        track = loop_station.slots[entry["track"] - 1]
+        self.written[entry["track"]] = (weakref.ref(track), track.version)
+        return True
@@ -0,0 +1,94 @@
+import threading
+import time
+
+# In-memory stand-in for RPi.GPIO
+# Implements the subset of the RPi.GPIO interface used by the looper. Pin levels are driven
+# from code with set_input(), which fires edge callbacks like a real interrupt would.
+class SimulatedGPIO:
+    BCM = 11
+    BOARD = 10
+    IN = 1
+    OUT = 0
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.levels = {}
+        self.modes = {}
+        self.callbacks = {}
+        self.links = {}  # Output pin -> input pins it is switched through to (held keypad keys)
+        self.edges = []  # (timestamp, pin, level) for every level change
+
+    def setwarnings(self, flag):
+        pass
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setup(self, pin, mode, pull_up_down=None, initial=None):
+        with self.lock:
+            self.modes[pin] = mode
+            if initial is not None:
+                self.levels[pin] = initial
+            elif pin not in self.levels:
+                self.levels[pin] = self.HIGH if pull_up_down == self.PUD_UP else self.LOW
+
+    def input(self, pin):
+        return self.levels.get(pin, self.LOW)
+
+    def output(self, pin, value):
+        self.set_input(pin, value)
+        for linked in list(self.links.get(pin, ())):
+            self.update_linked(linked)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        with self.lock:
+            self.callbacks[pin] = (edge, callback)
+
+    def remove_event_detect(self, pin):
+        with self.lock:
+            self.callbacks.pop(pin, None)
+
+    def cleanup(self, pins=None):
+        with self.lock:
+            for pin in (pins if pins is not None else list(self.modes)):
+                self.modes.pop(pin, None)
+                self.callbacks.pop(pin, None)
+
+    # Close or open a switch between an output and an input pin, like a key of a matrix keypad
+    def connect(self, output_pin, input_pin):
+        with self.lock:
+            self.links.setdefault(output_pin, set()).add(input_pin)
+        self.update_linked(input_pin)
+
+    def disconnect(self, output_pin, input_pin):
+        with self.lock:
+            self.links.get(output_pin, set()).discard(input_pin)
+        self.update_linked(input_pin)
+
+    # An input switched to several outputs is high if any of them is (pull-down otherwise)
+    def update_linked(self, input_pin):
+        with self.lock:
+            level = any(self.input(out) == self.HIGH
+                        for out, inputs in self.links.items() if input_pin in inputs)
+        self.set_input(input_pin, self.HIGH if level else self.LOW)
+
+    # Drive a pin to a new level and fire the edge callback if one is registered
+    def set_input(self, pin, level):
+        with self.lock:
+            if self.levels.get(pin, self.LOW) == level:
+                return
+            self.levels[pin] = level
+            self.edges.append((time.monotonic(), pin, level))
+            edge, callback = self.callbacks.get(pin, (None, None))
+        if callback is None:
+            return
+        if edge == self.BOTH or (edge == self.RISING) == (level == self.HIGH):
+            callback(pin)
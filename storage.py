@@ -0,0 +1,154 @@
+import array
+import collections
+import math
+import threading
+import time
+from pyo import NewTable
+
+# Compact loop storage
+# pyo keeps every table as 32-bit floats, so a 96 s stereo loop at 48 kHz holds about 37 MB.
+# Once a loop is recorded it never changes, so it can be kept as int16 (half the size) and
+# only turned back into floats a block at a time for playback: a LoopStore thread converts
+# the finished table, then keeps a small ring table filled ahead of the scheduler position.
+# The track plays the ring instead of the big table, which is shrunk and freed.
+
+RING_BLOCKS = 8  # Blocks in a ring table; the block being played plus the ones loaded ahead
+BLOCK_TARGET = 8192  # Largest block in samples, one block is converted per step
+FADE_TIME = 0.01  # Crossfade from the float table to the ring
+JOB_PAUSE = 0.001  # Sleep between conversion steps, lets the keypad and display threads take the GIL
+
+# Block size that splits the loop into a whole number of rings, so block b always sits at
+# ring slot b % RING_BLOCKS and ring position = loop position % ring size, across the wrap too
+def plan_blocks(samples, ring_blocks=RING_BLOCKS, target=BLOCK_TARGET):
+    if samples < ring_blocks * target:
+        return None  # Short loops are left as they are
+    first = math.ceil(samples / (ring_blocks * target))
+    for k in range(first, 4 * first + 1):
+        block = math.ceil(samples / (ring_blocks * k))
+        if math.ceil(samples / block) % ring_blocks == 0:
+            return block
+    return None
+
+class CompactLoop:
+    def __init__(self, table, block):
+        self.table = table
+        self.samples = table.getSize()
+        self.channels = len(table)
+        self.block = block
+        self.blocks = math.ceil(self.samples / block)
+        self.ring_size = block * RING_BLOCKS
+        self.data = [array.array('h') for _ in range(self.channels)]
+        self.scale = 1.0  # Float value of one int16 step
+        self.ring = None
+        self.loaded = [-1] * RING_BLOCKS  # Loop block held by each ring slot
+
+    def nbytes(self):
+        ring = self.ring_size * self.channels * 4 if self.ring is not None else 0
+        return sum(len(data) * data.itemsize for data in self.data) + ring
+
+    # Convert the float table to int16, one block per step so the caller can interleave other work
+    def convert(self):
+        views = [memoryview(self.table.getBuffer(chnl))[:self.samples] for chnl in range(self.channels)]
+        peak = 0.0
+        for start in range(0, self.samples, self.block):
+            for view in views:
+                block = view[start:start + self.block]
+                peak = max(peak, max(block), -min(block))
+            yield
+        self.scale = peak / 32767 if peak > 0 else 1.0
+        to_int = 1 / self.scale
+        for start in range(0, self.samples, self.block):
+            for view, data in zip(views, self.data):
+                block = view[start:start + self.block]
+                values = map(round, map(to_int.__mul__, block))
+                if max(max(block), -min(block)) * to_int > 32767:
+                    values = (max(-32767, min(32767, value)) for value in values)  # Louder than the peak pass saw
+                data.extend(values)
+            yield
+        for view in views:
+            view.release()
+
+        self.ring = NewTable(length=1, chnls=self.channels)
+        self.ring.setSize(self.ring_size)
+        self.ring.reset()
+
+    # Load the blocks from the one at `position` onwards into the ring
+    def fill(self, position):
+        current = int(position) // self.block
+        for ahead in range(RING_BLOCKS - 1):
+            block = (current + ahead) % self.blocks
+            slot = block % RING_BLOCKS
+            if self.loaded[slot] == block:
+                continue
+            start = block * self.block
+            for chnl, data in enumerate(self.data):
+                values = array.array('f', data[start:start + self.block])  # Unscaled, the playback mul scales it
+                memoryview(self.ring.getBuffer(chnl))[slot * self.block:slot * self.block + len(values)] = values
+            self.loaded[slot] = block
+
+    # The loop as raw float32, one channel after the other (see session.py)
+    def write_float32(self, f):
+        for data in self.data:
+            for start in range(0, self.samples, self.block):
+                f.write(array.array('f', map(self.scale.__mul__, data[start:start + self.block])))
+
+# Converts finished tracks and feeds the rings of the ones already converted
+class LoopStore:
+    def __init__(self, position, sr):
+        self.position = position  # Scheduler sample clock
+        self.jobs = collections.deque()
+        self.loops = []
+        self.period = BLOCK_TARGET / sr / 4  # Several refills per block even for the largest blocks
+        self.running = False
+
+        self.compacted = 0
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+
+    def submit(self, track):
+        self.jobs.append(self.compact(track))
+
+    # Stop feeding a loop's ring, e.g. when its track goes back to the float table
+    def release(self, loop):
+        if loop in self.loops:
+            self.loops.remove(loop)
+
+    def compact(self, track):
+        block = plan_blocks(track.table.getSize())
+        if block is None or track.compact is not None or track.overdubbing:
+            return
+        edits = track.edits
+        loop = CompactLoop(track.table, block)
+        for _ in loop.convert():
+            if track.overdubbing or track.edits != edits:
+                return  # The table is changing again, it is compacted once it has settled
+            yield
+        loop.fill(self.position.get())
+        # The swap waits out the crossfade, well inside the blocks already loaded ahead
+        if track.use_compact(loop, FADE_TIME, edits):
+            self.loops.append(loop)
+            self.compacted += 1
+
+    def run(self):
+        while self.running:
+            if self.jobs:
+                try:
+                    next(self.jobs[0])
+                except StopIteration:
+                    self.jobs.popleft()
+                except Exception as e:
+                    self.jobs.popleft()
+                    print(f"Loop conversion failed, the track stays as float32: {e!r}")
+            position = self.position.get()
+            for loop in list(self.loops):
+                try:
+                    loop.fill(position)
+                except Exception as e:
+                    self.release(loop)
+                    print(f"Loop ring refill failed, no longer feeding it: {e!r}")
+            time.sleep(JOB_PAUSE if self.jobs else self.period)
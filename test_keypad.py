@@ -0,0 +1,25 @@
+from keypad import KeypadScanner
+
+# Debouncing is driven through update() with made-up scan times, no GPIO needed
+def make_scanner():
+    return KeypadScanner(None, [], [], {(1, 13): 1})
+
+def test_bounce_shorter_than_debounce_is_ignored():
+    scanner = make_scanner()
+    assert scanner.debounce_time == 0.05
+    scanner.update({1}, 0.0)
+    scanner.update({1}, 0.03)
+    scanner.update(set(), 0.04)  # Bounced back open
+    scanner.update(set(), 0.2)
+    assert scanner.events.empty()
+
+def test_press_is_reported_after_debounce():
+    scanner = make_scanner()
+    scanner.update({1}, 0.0)
+    scanner.update({1}, 0.049)
+    assert scanner.events.empty()
+    scanner.update({1}, 0.05)
+    assert scanner.events.get_nowait() == (1, True, 0.0)
+    scanner.update(set(), 0.2)
+    scanner.update(set(), 0.26)
+    assert scanner.events.get_nowait() == (1, False, 0.2)
@@ -0,0 +1,218 @@
+import array
+import json
+import os
+import time
+import pytest
+from pyo import NewTable, Server, Sig
+from loopstation import LoopStation
+from session import SESSION_FILE, SessionStore
+from storage import CompactLoop, LoopStore
+
+# Engine tests on pyo's manual server: every s.process() call renders one buffer on this
+# thread, so the audio callbacks run in order with the test.
+#   python -m pytest -q test_loopstation.py
+
+SR = 48000
+BUFFER_SIZE = 256
+
+@pytest.fixture(scope="module")
+def server():
+    s = Server(sr=SR, buffersize=BUFFER_SIZE, audio='manual', nchnls=2, ichnls=2).boot().start()
+    yield s
+    s.stop()
+    s.shutdown()
+
+# The app never throws a LoopStation away and pyo does not like it either, so they are all kept
+stations = []
+
+# 240 BPM, 4/4: a one second count-in, then loops of one second per bar
+def make_station(server, bars=1, **kwargs):
+    config_option_values = {"BPM": 240, "TIME SIGNATURE": "4/4", "TOTAL BARS": bars}
+    station = LoopStation(server, config_option_values, 0, input_bus=Sig([0.1, 0.1]), channel_mode="stereo", **kwargs)
+    stations.append(station)
+    return station
+
+# Render `seconds` of audio, advancing the track's undo history after every buffer
+def run(server, seconds, track=None):
+    for _ in range(int(seconds * SR / BUFFER_SIZE)):
+        server.process()
+        if track is not None and track.history is not None:
+            track.history.advance()
+
+def test_one_callback_per_pass_in_stereo(server):
+    recorded = []
+    station = make_station(server, on_track_recorded=recorded.append)
+    assert station.channels == 2
+    station.init_master_track()
+    run(server, 2.5)  # Count-in, then the first take
+    assert len(recorded) == 1
+    run(server, 1)  # The loop keeps playing without recording again
+    assert len(recorded) == 1
+
+def test_overdub_twice_past_undo_memory(server):
+    station = make_station(server, overdub=True, undo_memory=0.01)
+    track = station.master_track
+    station.init_master_track()
+    run(server, 2.5, track)  # Count-in, then the first take
+    assert track.recorded
+
+    # Both layers are larger than the undo memory, so neither can be kept
+    for _ in range(2):
+        station.init_master_track()
+        assert track.overdubbing
+        run(server, 2, track)
+        assert not track.overdubbing
+    assert track.history.lost == 2
+    assert len(track.history.undo_entries) == 1  # Only the first take, which was recorded over silence
+
+def test_config_tables_are_built_once(server):
+    station = make_station(server)
+    deadline = time.monotonic() + 5
+    while station.allocator.metrics()["allocations"] < station.num_slots and time.monotonic() < deadline:
+        time.sleep(0.01)  # The slots after the master are built in the background
+    for track_num in range(2, station.num_slots + 1):
+        assert station.prepare_slot(track_num)
+    metrics = station.allocator.metrics()
+    assert metrics["allocations"] == station.num_slots
+    assert metrics["misses"] <= 1  # Only the master, if nothing was ready
+    assert metrics["ready"] == 0  # Nothing left parked once the slots have their tables
+
+def test_budget_counts_clicks_and_undo_memory(server):
+    # 1 s stereo tables of 0.384 MB, 0.1 MB of undo memory each and a 0.384 MB click table
+    station = make_station(server, memory_budget=2, budget_action="refuse", undo_memory=0.1)
+    assert station.preallocated_slots() == 3
+    assert station.memory_usage() <= 2e6
+    assert not station.prepare_slot(4)
+
+    # Only as many tables are built ahead for a new config as fit next to the live tracks
+    station.prepare_slot(2)
+    station.config_option_values["BPM"] = 200
+    station.update_metronome()
+    live = sum(track.memory() for track in station.slots)
+    assert station.allocator.wanted == station.preallocated_slots(live)
+    assert live + station.allocator.wanted * station.slot_bytes() + station.click_bytes() <= 2e6
+
+def test_config_change_clears_saved_session(server, tmp_path):
+    station = make_station(server)
+    store = SessionStore(str(tmp_path))
+    station.init_master_track()
+    run(server, 2.5)
+    store.write(station)
+    assert sorted(os.listdir(tmp_path)) == [SESSION_FILE, "track1.f32"]
+
+    station.config_option_values["BPM"] = 120
+    station.update_metronome()
+    assert station.apply_config()
+    store.write(station)
+    with open(tmp_path / SESSION_FILE) as f:
+        session = json.load(f)
+    assert session["config"]["BPM"] == 120
+    assert session["tracks"] == []
+    assert os.listdir(tmp_path) == [SESSION_FILE]
+
+def test_overdub_cancels_running_compaction(server):
+    # Two second loops are long enough to be kept as int16
+    station = make_station(server, bars=2, storage="int16", overdub=True)
+    station.store.stop()  # The conversion is stepped by hand below
+    time.sleep(0.2)
+    track = station.master_track
+    station.init_master_track()
+    run(server, 3.5)  # Count-in, then the first take
+    job = station.store.jobs.popleft()
+    for _ in range(4):
+        next(job)
+
+    # A louder layer lands while the first take is still being converted
+    station.init_master_track()
+    run(server, 4)  # Armed for the next loop boundary, then one pass
+    assert not track.overdubbing
+    for _ in job:
+        pass
+    assert track.compact is None
+    assert track.table.getSize() > 1
+    assert len(station.store.jobs) == 1  # The new layers are converted instead
+
+def test_conversion_clamps_samples_louder_than_the_peak(server):
+    table = NewTable(length=1, chnls=1)
+    size = table.getSize()
+    memoryview(table.getBuffer(0))[:] = array.array('f', [0.1] * size)
+    loop = CompactLoop(table, 8192)
+    steps = loop.convert()
+    for _ in range(loop.blocks):  # The peak pass
+        next(steps)
+    memoryview(table.getBuffer(0))[:] = array.array('f', [0.5] * size)
+    for _ in steps:
+        pass
+    assert max(loop.data[0]) == 32767
+
+def test_failed_job_does_not_stop_the_store(server):
+    def failing():
+        yield
+        raise ValueError("bad table")
+
+    store = LoopStore(Sig(0), SR)
+    store.jobs.append(failing())
+    store.start()
+    time.sleep(0.1)
+    store.stop()
+    assert not store.jobs
+
+def test_broken_session_loads_empty(server, tmp_path):
+    station = make_station(server)
+    store = SessionStore(str(tmp_path))
+    station.init_master_track()
+    run(server, 2.5)
+    store.write(station)
+    assert store.load(make_station(server)) == [1]
+
+    with open(tmp_path / "track1.f32", "r+b") as f:
+        f.truncate(1000)
+    assert store.load(make_station(server)) == []
+    os.remove(tmp_path / "track1.f32")
+    assert store.load(make_station(server)) == []
+    with open(tmp_path / SESSION_FILE, "w") as f:
+        f.write('{"sr": 48000, "config": ')
+    assert store.load(make_station(server)) == []
+
+def test_session_keeps_the_applied_config(server, tmp_path):
+    station = make_station(server)
+    store = SessionStore(str(tmp_path))
+    station.init_master_track()
+    run(server, 2.5)
+    station.config_option_values["BPM"] = 100  # Still on the config screen
+    station.update_metronome()
+    store.write(station)
+    with open(tmp_path / SESSION_FILE) as f:
+        assert json.load(f)["config"]["BPM"] == 240
+    assert store.load(make_station(server)) == [1]
+
+def test_session_rewrites_only_changed_tracks(server, tmp_path):
+    station = make_station(server, overdub=True)
+    store = SessionStore(str(tmp_path))
+    station.init_master_track()
+    run(server, 2.5)
+    station.init_track(2)
+    run(server, 2)
+    store.write(station)
+    assert store.tracks_written == 2
+    store.write(station)
+    assert store.tracks_written == 2  # Nothing changed
+
+    station.init_master_track()  # Overdub the master only
+    run(server, 2.5)
+    store.write(station)
+    assert store.tracks_written == 3
+
+def test_undo_saves_the_session(server):
+    recorded = []
+    station = make_station(server, overdub=True, undo_memory=1, on_track_recorded=recorded.append)
+    track = station.master_track
+    station.init_master_track()
+    run(server, 2.5, track)
+    station.init_master_track()  # A second layer
+    run(server, 2.5, track)
+    assert len(recorded) == 2
+    assert station.undo(1)
+    assert len(recorded) == 3
+    assert station.redo(1)
+    assert len(recorded) == 4